@@ -0,0 +1,14 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        "pk", "name", "run_at", "attempts", "failed", "locked_by"
+    )
+    list_filter = ("failed", "name")
+    readonly_fields = ("created",)
+
+
+admin.site.register(Job, JobAdmin)
@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = "core"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .db_router import track_writes
+        from .sqlite import configure_connection
+
+        connection_created.connect(configure_connection)
+        connection_created.connect(track_writes)
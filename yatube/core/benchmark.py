@@ -0,0 +1,171 @@
+"""Нагрузочный прогон страниц через WSGI-приложение проекта.
+
+Запросы идут прямо в WSGI-обработчик Django из нескольких потоков,
+без сети и без тестового клиента, поэтому через все middleware.
+Для каждого сценария считаются перцентили задержки, пропускная
+способность и среднее число SQL-запросов; результаты сохраняются в
+JSON и сравниваются с прошлым прогоном.
+"""
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.auth import (
+    BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+)
+from django.db import connection, connections
+from django.middleware.csrf import _get_new_csrf_token
+from django.utils.module_loading import import_string
+
+METRICS = ("p50", "p95", "p99")
+
+
+class Session:
+    """Куки вошедшего пользователя и CSRF-токен для POST-запросов."""
+
+    def __init__(self, user):
+        engine = import_string(settings.SESSION_ENGINE)
+        store = engine.SessionStore()
+        store[SESSION_KEY] = str(user.pk)
+        store[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        store[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        store.save()
+        self.csrf_token = _get_new_csrf_token()
+        self.cookie = (
+            f"{settings.SESSION_COOKIE_NAME}={store.session_key}; "
+            f"{settings.CSRF_COOKIE_NAME}={self.csrf_token}"
+        )
+
+
+def call(application, method, path, data=None, session=None):
+    """Выполнить запрос; вернуть код ответа и число SQL-запросов."""
+    path, _, query = path.partition("?")
+    body = b""
+    environ = {
+        "REQUEST_METHOD": method,
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "SERVER_NAME": "localhost",
+        "HTTP_HOST": "localhost",
+    }
+    if data is not None:
+        if session is not None:
+            data = dict(data, csrfmiddlewaretoken=session.csrf_token)
+        body = urlencode(data).encode()
+        environ["CONTENT_TYPE"] = "application/x-www-form-urlencoded"
+    if session is not None:
+        environ["HTTP_COOKIE"] = session.cookie
+    environ["CONTENT_LENGTH"] = str(len(body))
+    environ["wsgi.input"] = BytesIO(body)
+    setup_testing_defaults(environ)
+    status = []
+    queries = []
+
+    def count(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        response = application(
+            environ, lambda code, headers, exc_info=None: status.append(code)
+        )
+        try:
+            for _ in response:
+                pass
+        finally:
+            if hasattr(response, "close"):
+                response.close()
+    return int(status[0].split()[0]), len(queries)
+
+
+def percentile(values, share):
+    """Перцентиль по ближайшему рангу, ``share`` от 0 до 1."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(share * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_scenario(application, scenario, requests, concurrency, seed=0):
+    """Прогнать ``requests`` запросов сценария в ``concurrency`` потоков.
+
+    ``scenario(rng)`` возвращает кортеж ``(method, path, data, session)``.
+    """
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        timings, statuses, queries = [], [], []
+        for _ in range(requests // concurrency
+                       + (index < requests % concurrency)):
+            method, path, data, session = scenario(rng)
+            started = time.perf_counter()
+            status, count = call(application, method, path, data, session)
+            timings.append(time.perf_counter() - started)
+            statuses.append(status)
+            queries.append(count)
+        if concurrency > 1:
+            connections.close_all()
+        return timings, statuses, queries
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            parts = list(pool.map(worker, range(concurrency)))
+    else:
+        parts = [worker(0)]
+    elapsed = time.perf_counter() - started
+    timings = [value for part in parts for value in part[0]]
+    statuses = [value for part in parts for value in part[1]]
+    queries = [value for part in parts for value in part[2]]
+    return {
+        "requests": len(timings),
+        "errors": sum(status >= 400 for status in statuses),
+        "p50": percentile(timings, 0.50) * 1000,
+        "p95": percentile(timings, 0.95) * 1000,
+        "p99": percentile(timings, 0.99) * 1000,
+        "throughput": len(timings) / elapsed if elapsed else 0.0,
+        "queries": sum(queries) / len(queries) if queries else 0.0,
+    }
+
+
+def compare(baseline, results, tolerance=0.2):
+    """Регрессии относительно ``baseline``: список строк с описаниями.
+
+    Задержка может вырасти не больше чем на ``tolerance``, число
+    запросов к БД и ошибок — не расти вовсе.
+    """
+    problems = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in METRICS:
+            limit = previous[metric] * (1 + tolerance)
+            if current[metric] > limit:
+                problems.append(
+                    f"{name}: {metric} {current[metric]:.1f} мс"
+                    f" > {limit:.1f} мс"
+                )
+        if current["queries"] > previous["queries"]:
+            problems.append(
+                f"{name}: запросов к БД {current['queries']:.1f}"
+                f" вместо {previous['queries']:.1f}"
+            )
+        if current["errors"] > previous["errors"]:
+            problems.append(f"{name}: ошибок {current['errors']}")
+    return problems
+
+
+def load(path):
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save(path, results):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(results, file, ensure_ascii=False, indent=2)
@@ -0,0 +1,255 @@
+"""Общий для всех процессов кеш в файле SQLite.
+
+``LocMemCache`` у каждого воркера gunicorn свой, поэтому инвалидация в
+одном воркере не видна остальным. Этот бэкенд хранит записи в одном
+файле (режим WAL), вытесняет давно не читавшиеся записи при превышении
+``MAX_ENTRIES`` или ``MAX_SIZE`` байт и ведёт статистику попаданий,
+промахов и вытеснений.
+
+Пример настройки::
+
+    CACHES = {
+        "default": {
+            "BACKEND": "core.cache.SQLiteCache",
+            "LOCATION": "/var/cache/yatube/cache.sqlite3",
+            "OPTIONS": {"MAX_ENTRIES": 100000, "MAX_SIZE": 256 * 2 ** 20},
+        }
+    }
+"""
+import pickle
+import threading
+import time
+from collections import Counter
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .sqlite import LocalConnection
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS cache ("
+    " key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL,"
+    " accessed REAL NOT NULL, size INTEGER NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)",
+    "CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)",
+    "CREATE TABLE IF NOT EXISTS stats ("
+    " name TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+)
+UPSERT = (
+    "INSERT INTO cache (key, value, expires, accessed, size)"
+    " VALUES (?, ?, ?, ?, ?)"
+    " ON CONFLICT (key) DO UPDATE SET value = excluded.value,"
+    " expires = excluded.expires, accessed = excluded.accessed,"
+    " size = excluded.size"
+)
+ALIVE = "(expires IS NULL OR expires > ?)"
+
+
+class SQLiteCache(BaseCache):
+    # время чтения обновляется не чаще раза в ACCESS_RESOLUTION секунд,
+    # чтобы каждое попадание не превращалось в запись
+    ACCESS_RESOLUTION = 30
+    CULL_EVERY = 50
+    STATS_FLUSH_INTERVAL = 1.0
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._max_size = int(options.get("MAX_SIZE", 256 * 2 ** 20))
+        self._connection = LocalConnection(
+            location, SCHEMA, float(options.get("BUSY_TIMEOUT", 5))
+        )
+        self._lock = threading.Lock()
+        self._stats = Counter()
+        self._stats_flushed = time.monotonic()
+        self._writes = 0
+
+    @property
+    def _db(self):
+        return self._connection.get()
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+            due = (time.monotonic() - self._stats_flushed
+                   > self.STATS_FLUSH_INTERVAL)
+        if due:
+            self._flush_stats()
+
+    def _flush_stats(self):
+        with self._lock:
+            pending, self._stats = self._stats, Counter()
+            self._stats_flushed = time.monotonic()
+        if pending:
+            self._db.executemany(
+                "INSERT INTO stats (name, value) VALUES (?, ?)"
+                " ON CONFLICT (name) DO UPDATE"
+                " SET value = value + excluded.value",
+                pending.items(),
+            )
+
+    def _read(self, keys):
+        """Живые записи по ключам; попадания и промахи учитываются."""
+        now = time.time()
+        found = {}
+        keys = list(keys)
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            marks = ", ".join("?" * len(chunk))
+            rows = self._db.execute(
+                f"SELECT key, value, accessed FROM cache"
+                f" WHERE key IN ({marks}) AND {ALIVE}",
+                chunk + [now],
+            ).fetchall()
+            touched = []
+            for key, value, accessed in rows:
+                found[key] = pickle.loads(value)
+                if now - accessed > self.ACCESS_RESOLUTION:
+                    touched.append((now, key))
+            if touched:
+                self._db.executemany(
+                    "UPDATE cache SET accessed = ? WHERE key = ?", touched
+                )
+        self._count("hits", len(found))
+        self._count("misses", len(keys) - len(found))
+        return found
+
+    def _write(self, rows):
+        now = time.time()
+        self._db.executemany(UPSERT, [
+            (key, blob, expires, now, len(blob))
+            for key, blob, expires in rows
+        ])
+        self._writes += len(rows)
+        if self._writes >= self.CULL_EVERY:
+            self._writes = 0
+            self._cull()
+
+    def _row(self, key, value, timeout):
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        return key, blob, self.get_backend_timeout(timeout)
+
+    def _cull(self):
+        db = self._db
+        db.execute(
+            "DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?",
+            (time.time(),),
+        )
+        entries, size = db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache"
+        ).fetchone()
+        if entries <= self._max_entries and size <= self._max_size:
+            return
+        # вытесняем давно не читавшиеся записи с запасом в 10%
+        excess = max(
+            entries - int(self._max_entries * 0.9),
+            int(entries * (1 - self._max_size * 0.9 / size)) if size else 0,
+            1,
+        )
+        evicted = db.execute(
+            "DELETE FROM cache WHERE key IN"
+            " (SELECT key FROM cache ORDER BY accessed LIMIT ?)",
+            (excess,),
+        ).rowcount
+        self._count("evictions", evicted)
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._read([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        found = self._read(keys)
+        return {keys[key]: value for key, value in found.items()}
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        row = self._db.execute(
+            f"SELECT 1 FROM cache WHERE key = ? AND {ALIVE}",
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write([self._row(self._key(key, version), value, timeout)])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        rows = [
+            self._row(self._key(key, version), value, timeout)
+            for key, value in data.items()
+        ]
+        self._write(rows)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key, blob, expires = self._row(
+            self._key(key, version), value, timeout
+        )
+        now = time.time()
+        cursor = self._db.execute(
+            UPSERT + " WHERE cache.expires IS NOT NULL AND cache.expires <= ?",
+            (key, blob, expires, now, len(blob), now),
+        )
+        return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        cursor = self._db.execute(
+            f"UPDATE cache SET expires = ? WHERE key = ? AND {ALIVE}",
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        db = self._db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                f"SELECT value FROM cache WHERE key = ? AND {ALIVE}",
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            db.execute(
+                "UPDATE cache SET value = ?, size = ? WHERE key = ?",
+                (blob, len(blob), key),
+            )
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        return value
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def delete_many(self, keys, version=None):
+        self._db.executemany(
+            "DELETE FROM cache WHERE key = ?",
+            [(self._key(key, version),) for key in keys],
+        )
+
+    def clear(self):
+        self._db.execute("DELETE FROM cache")
+
+    def get_stats(self):
+        """Счётчики попаданий, промахов и вытеснений всех процессов."""
+        self._flush_stats()
+        stats = dict.fromkeys(("hits", "misses", "evictions"), 0)
+        stats.update(self._db.execute("SELECT name, value FROM stats"))
+        stats["entries"], stats["size"] = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache"
+        ).fetchone()
+        return stats
+
+    def close(self, **kwargs):
+        # соединения живут всё время процесса, как и у LocMemCache
+        pass
@@ -0,0 +1,172 @@
+"""Чтение с реплик, запись в основную БД.
+
+Реплики перечислены в ``DATABASE_REPLICAS``. С них читают только
+безопасные HTTP-запросы (``ReplicaMiddleware``); команды, фоновые
+задачи и запросы с записью работают с ``default``. После записи
+пользователь получает куку ``REPLICA_PIN_COOKIE`` и ещё
+``REPLICA_PIN_SECONDS`` секунд читает с основной БД, поэтому сразу
+видит свой пост или комментарий. Модели приложений ``PRIMARY_APPS``
+(сессии, пользователи, задания) и всё, что читается в запросе после
+записи, всегда берутся из основной БД.
+
+Каждая зафиксированная запись в основную БД — из запроса, задания,
+команды или миграции — обновляет строку ``Heartbeat`` (``track_writes``
+следит за SQL соединения), а ``sync_replicas`` копирует её вместе с
+данными. Раз в ``REPLICA_CHECK_INTERVAL`` секунд метки реплик
+сравниваются с меткой основной БД; отставшие больше чем на
+``REPLICA_MAX_LAG`` секунд, реплики с неизвестным отставанием и
+недоступные выводятся из ротации.
+"""
+import logging
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from . import profiling
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_lock = threading.Lock()
+_health = {"checked": None, "healthy": []}
+
+# их читают сразу после записи: сессия, вход, очередь заданий
+PRIMARY_APPS = {"admin", "auth", "contenttypes", "core", "sessions"}
+WRITE_RE = re.compile(r"\s*(INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+
+
+def replicas():
+    return list(getattr(settings, "DATABASE_REPLICAS", ()))
+
+
+@contextmanager
+def reading_from_replicas(enabled=True):
+    previous = (
+        getattr(_local, "enabled", False), getattr(_local, "wrote", False)
+    )
+    _local.enabled, _local.wrote = enabled, False
+    try:
+        yield
+    finally:
+        _local.enabled, _local.wrote = previous
+
+
+def _heartbeats(alias):
+    return apps.get_model("core", "Heartbeat").objects.using(alias)
+
+
+def beat():
+    """Отметить запись в основную БД, если есть реплики."""
+    if not replicas():
+        return
+    now = timezone.now()
+    heartbeats = _heartbeats("default")
+    if not heartbeats.filter(pk=1).update(beat=now):
+        heartbeats.bulk_create(
+            [heartbeats.model(pk=1, beat=now)], ignore_conflicts=True
+        )
+
+
+def _beat_after_commit():
+    try:
+        beat()
+    except DatabaseError:
+        # таблицы ещё нет: запись сделала миграция до core.0002
+        pass
+
+
+def _track(execute, sql, params, many, context):
+    result = execute(sql, params, many, context)
+    connection = context["connection"]
+    if (replicas()
+            and WRITE_RE.match(sql)
+            and "core_heartbeat" not in sql
+            and not any(func is _beat_after_commit
+                        for _, func in connection.run_on_commit)):
+        # вне транзакции выполнится сразу, внутри — после COMMIT
+        transaction.on_commit(_beat_after_commit, using=connection.alias)
+    return result
+
+
+def track_writes(sender, connection, **kwargs):
+    """Обработчик ``connection_created``: метка на каждую запись."""
+    if connection.alias == "default" and (
+        _track not in connection.execute_wrappers
+    ):
+        connection.execute_wrappers.append(_track)
+
+
+def _last_beat(alias):
+    return _heartbeats(alias).filter(pk=1).values_list(
+        "beat", flat=True
+    ).first()
+
+
+def lag(alias):
+    """На сколько секунд реплика отстаёт; ``None``, если неизвестно."""
+    primary = _last_beat("default")
+    if primary is None:
+        return None
+    replica = _last_beat(alias)
+    if replica is None:
+        return float("inf")
+    return max((primary - replica).total_seconds(), 0)
+
+
+def check_replicas():
+    healthy = []
+    for alias in replicas():
+        try:
+            behind = lag(alias)
+        except DatabaseError:
+            logger.warning("Реплика %s недоступна", alias, exc_info=True)
+            continue
+        if behind is None:
+            logger.warning("Отставание реплики %s неизвестно", alias)
+            continue
+        if behind > settings.REPLICA_MAX_LAG:
+            logger.warning("Реплика %s отстаёт на %s с", alias, behind)
+            continue
+        healthy.append(alias)
+    return healthy
+
+
+def healthy_replicas():
+    now = time.monotonic()
+    with _lock:
+        checked = _health["checked"]
+        due = (checked is None
+               or now - checked >= settings.REPLICA_CHECK_INTERVAL)
+        if due:
+            _health["checked"] = now
+    if due:
+        with profiling.untracked():
+            _health["healthy"] = check_replicas()
+    return _health["healthy"]
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not getattr(_local, "enabled", False) or not replicas():
+            return None
+        if (getattr(_local, "wrote", False)
+                or model._meta.app_label in PRIMARY_APPS):
+            return None
+        healthy = healthy_replicas()
+        return random.choice(healthy) if healthy else "default"
+
+    def db_for_write(self, model, **hints):
+        # дальше в этом запросе читаем то, что записали
+        _local.wrote = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики — копии основной БД
+        return True
@@ -0,0 +1,214 @@
+"""Очередь фоновых заданий в основной БД, без внешнего брокера.
+
+Задание — строка ``Job``. Она вставляется в той же транзакции, что и
+породившая её запись, поэтому не теряется при падении процесса и не
+появляется, если транзакция откатилась. Разбирает очередь
+``manage.py run_workers``.
+
+Доставка «хотя бы один раз»: взяв задание, воркер сдвигает его
+``run_at`` на ``JOBS_VISIBILITY_TIMEOUT`` вперёд и увеличивает
+``attempts``, а после успеха удаляет строку в одной транзакции с
+работой задания. Если воркер упал, задание снова станет доступно по
+истечении этого срока, поэтому задания должны быть идемпотентными.
+Ошибка откладывает задание с экспоненциально растущей паузой; после
+``max_attempts`` попыток, включая оборвавшиеся вместе с воркером, оно
+помечается ``failed`` и остаётся в таблице для разбора.
+
+С ``JOBS_ALWAYS_EAGER`` ``delay`` выполняет задание сразу, как обычный
+вызов: так удобно при разработке и в тестах.
+"""
+import json
+import logging
+import os
+import random
+import socket
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from . import metrics, profiling
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+# пауза перед n-й повторной попыткой: BACKOFF_BASE * 2 ** (n - 1) секунд
+BACKOFF_BASE = 10
+BACKOFF_MAX = 60 * 60
+
+_registry = {}
+
+
+def _jobs():
+    # модуль с декоратором job импортируется и до загрузки моделей,
+    # например в дочернем процессе multiprocessing
+    return apps.get_model("core", "Job").objects
+
+
+def job(function=None, *, max_attempts=MAX_ATTEMPTS):
+    """Сделать функцию заданием, которое ставится в очередь ``delay``.
+
+    Аргументы ``delay`` должны сериализоваться в JSON.
+    """
+    def decorator(function):
+        name = f"{function.__module__}.{function.__qualname__}"
+        _registry[name] = function
+
+        def delay(*args, **kwargs):
+            payload = json.dumps({"args": args, "kwargs": kwargs})
+            if settings.JOBS_ALWAYS_EAGER:
+                data = json.loads(payload)
+                # в бою задание выполнит воркер, а не запрос: его
+                # запросы не входят в бюджет запроса
+                with profiling.untracked():
+                    return function(*data["args"], **data["kwargs"])
+            return _jobs().create(
+                name=name, payload=payload, max_attempts=max_attempts
+            )
+
+        function.delay = delay
+        function.job_name = name
+        return function
+
+    return decorator if function is None else decorator(function)
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def backoff(attempts):
+    """Пауза перед следующей попыткой, секунды; со случайным разбросом."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1)
+
+
+def claim(worker):
+    """Взять готовое задание или вернуть ``None``."""
+    now = timezone.now()
+    lease = now + timedelta(seconds=settings.JOBS_VISIBILITY_TIMEOUT)
+    candidates = _jobs().filter(
+        failed=False, run_at__lte=now
+    ).order_by("run_at")
+    for candidate in candidates[:10]:
+        if candidate.attempts >= candidate.max_attempts:
+            _expire(candidate)
+            continue
+        # задание могли взять между SELECT и UPDATE: тогда run_at другой
+        taken = _jobs().filter(
+            pk=candidate.pk, run_at=candidate.run_at, failed=False
+        ).update(run_at=lease, attempts=F("attempts") + 1, locked_by=worker)
+        if taken:
+            candidate.waited = (now - candidate.run_at).total_seconds()
+            candidate.run_at = lease
+            candidate.attempts += 1
+            candidate.locked_by = worker
+            return candidate
+    return None
+
+
+def _expire(job):
+    """Пометить ``failed`` задание, последняя аренда которого истекла.
+
+    Воркер умер посреди задания (OOM, SIGKILL) или не уложился в
+    ``JOBS_VISIBILITY_TIMEOUT``: ещё одна попытка сверх ``max_attempts``
+    скорее всего снова уронила бы воркер.
+    """
+    expired = _jobs().filter(
+        pk=job.pk, run_at=job.run_at, failed=False
+    ).update(
+        failed=True,
+        locked_by="",
+        last_error=f"Аренда истекла у воркера {job.locked_by}",
+    )
+    if expired:
+        logger.warning(
+            "Задание %s #%s не завершено за %s попыток", job.name, job.pk,
+            job.attempts,
+        )
+        metrics.inc("yatube_jobs_total", job=job.name, outcome="failed")
+
+
+def execute(job):
+    """Выполнить взятое задание; вернуть исход: done, retry или failed."""
+    started = time.perf_counter()
+    try:
+        function = _registry.get(job.name)
+        if function is None:
+            raise LookupError(f"Неизвестное задание {job.name}")
+        data = json.loads(job.payload)
+        with transaction.atomic():
+            # сначала запись: транзакция SQLite, начатая с чтения, не
+            # сможет писать, если её опередил другой воркер
+            _jobs().filter(pk=job.pk).delete()
+            function(*data["args"], **data["kwargs"])
+        outcome = "done"
+    except Exception as error:
+        outcome = _retry(job, error)
+    metrics.inc("yatube_jobs_total", job=job.name, outcome=outcome)
+    metrics.observe("yatube_job_wait_seconds", job.waited, job=job.name)
+    metrics.observe(
+        "yatube_job_duration_seconds", time.perf_counter() - started,
+        job=job.name,
+    )
+    return outcome
+
+
+def _retry(job, error):
+    failed = job.attempts >= job.max_attempts
+    logger.warning(
+        "Задание %s #%s упало (попытка %s из %s)", job.name, job.pk,
+        job.attempts, job.max_attempts, exc_info=True,
+    )
+    _jobs().filter(pk=job.pk).update(
+        failed=failed,
+        locked_by="",
+        last_error=f"{type(error).__name__}: {error}",
+        run_at=timezone.now() + timedelta(seconds=backoff(job.attempts)),
+    )
+    return "failed" if failed else "retry"
+
+
+def work(stop=lambda: False, burst=False):
+    """Выполнять задания, пока ``stop()`` ложно; вернуть их число.
+
+    С ``burst`` выйти, как только готовых заданий не останется.
+    """
+    worker = worker_name()
+    done = 0
+    while not stop():
+        job = claim(worker)
+        if job is None:
+            if burst:
+                break
+            time.sleep(settings.JOBS_POLL_INTERVAL)
+            continue
+        execute(job)
+        done += 1
+    return done
+
+
+def stats():
+    """Глубина очереди по состояниям и возраст самого старого задания.
+
+    ``dead`` — задания, исчерпавшие попытки.
+    """
+    now = timezone.now()
+    ready = Q(failed=False, run_at__lte=now)
+    waiting = Q(failed=False, run_at__gt=now)
+    row = _jobs().aggregate(
+        ready=Count("id", filter=ready),
+        running=Count("id", filter=waiting & ~Q(locked_by="")),
+        scheduled=Count("id", filter=waiting & Q(locked_by="")),
+        oldest=Min("run_at", filter=ready),
+        dead=Count("id", filter=Q(failed=True)),
+    )
+    oldest = row.pop("oldest")
+    row["oldest_seconds"] = (
+        (now - oldest).total_seconds() if oldest is not None else 0
+    )
+    return row
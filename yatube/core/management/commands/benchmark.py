@@ -0,0 +1,160 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from core import benchmark
+from posts import dataset
+from posts.models import Group, Post
+
+User = get_user_model()
+
+SAMPLE_SIZE = 10000
+SESSIONS = 50
+
+
+class Scenarios:
+    """Запросы к страницам yatube со случайными, но типичными адресами."""
+
+    def __init__(self, rng):
+        users = list(
+            User.objects.order_by("id").values_list("id", "username")
+        )
+        if not users:
+            raise CommandError("В БД нет пользователей: запустите с --seed")
+        # у первых пользователей больше всего подписчиков
+        self.usernames = [username for _, username in users]
+        self.weights = dataset.skewed_weights(len(users))
+        self.slugs = list(Group.objects.values_list("slug", flat=True))
+        post_ids = list(Post.objects.values_list("id", flat=True))
+        self.post_ids = rng.sample(post_ids, min(len(post_ids), SAMPLE_SIZE))
+        sample = rng.sample(users, min(len(users), SESSIONS))
+        self.sessions = [
+            benchmark.Session(user) for user in
+            User.objects.filter(id__in=[pk for pk, _ in sample])
+        ]
+
+    def index(self, rng):
+        return "GET", reverse("posts:home_page"), None, None
+
+    def group_posts(self, rng):
+        slug = rng.choice(self.slugs)
+        return "GET", reverse("posts:group_posts", args=[slug]), None, None
+
+    def profile(self, rng):
+        username = rng.choices(self.usernames, self.weights)[0]
+        return "GET", reverse("posts:profile", args=[username]), None, None
+
+    def post_detail(self, rng):
+        post_id = rng.choice(self.post_ids)
+        return "GET", reverse("posts:post_detail", args=[post_id]), None, None
+
+    def follow_index(self, rng):
+        session = rng.choice(self.sessions)
+        return "GET", reverse("posts:follow_index"), None, session
+
+    def post_create(self, rng):
+        data = {"text": f"Нагрузочный пост {rng.random()}"}
+        session = rng.choice(self.sessions)
+        return "POST", reverse("posts:post_create"), data, session
+
+    def add_comment(self, rng):
+        post_id = rng.choice(self.post_ids)
+        data = {"text": f"Нагрузочный комментарий {rng.random()}"}
+        session = rng.choice(self.sessions)
+        path = reverse("posts:add_comment", args=[post_id])
+        return "POST", path, data, session
+
+    names = (
+        "index", "group_posts", "profile", "post_detail", "follow_index",
+        "post_create", "add_comment",
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный прогон страниц через WSGI: перцентили задержки, "
+        "пропускная способность и запросы к БД"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed", action="store_true",
+            help="сначала наполнить БД синтетическими данными"
+        )
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--groups", type=int, default=20)
+        parser.add_argument("--posts", type=int, default=10000)
+        parser.add_argument("--comments", type=int, default=10000)
+        parser.add_argument("--follows-per-user", type=int, default=20)
+        parser.add_argument("--random-seed", type=int, default=0)
+        parser.add_argument(
+            "--requests", type=int, default=200,
+            help="запросов на каждый сценарий"
+        )
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument(
+            "--scenarios", default=",".join(Scenarios.names),
+            help="сценарии через запятую"
+        )
+        parser.add_argument("--save", help="сохранить результаты в JSON")
+        parser.add_argument(
+            "--compare", help="сравнить с результатами из JSON"
+        )
+        parser.add_argument(
+            "--tolerance", type=float, default=0.2,
+            help="допустимый рост задержки, доля (по умолчанию 0.2)"
+        )
+
+    def handle(self, *args, **options):
+        # не yatube.wsgi: он снова вызвал бы django.setup() и LOGGING
+        application = WSGIHandler()
+        if options["seed"]:
+            dataset.generate(
+                users=options["users"],
+                groups=options["groups"],
+                posts=options["posts"],
+                comments=options["comments"],
+                follows_per_user=options["follows_per_user"],
+                seed=options["random_seed"],
+            )
+            dataset.refresh()
+        names = options["scenarios"].split(",")
+        unknown = set(names) - set(Scenarios.names)
+        if unknown:
+            raise CommandError(f"Неизвестные сценарии: {', '.join(unknown)}")
+        scenarios = Scenarios(random.Random(options["random_seed"]))
+        results = {}
+        for name in names:
+            results[name] = benchmark.run_scenario(
+                application,
+                getattr(scenarios, name),
+                options["requests"],
+                options["concurrency"],
+                options["random_seed"],
+            )
+            self.report(name, results[name])
+        if options["save"]:
+            benchmark.save(options["save"], results)
+        if options["compare"]:
+            problems = benchmark.compare(
+                benchmark.load(options["compare"]),
+                results,
+                options["tolerance"],
+            )
+            if problems:
+                raise CommandError(
+                    "Регрессия производительности:\n" + "\n".join(problems)
+                )
+        self.stdout.write(self.style.SUCCESS("Прогон завершён"))
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:<14} p50 {result['p50']:7.1f} мс"
+            f"  p95 {result['p95']:7.1f} мс  p99 {result['p99']:7.1f} мс"
+            f"  {result['throughput']:7.1f} запр/с"
+            f"  SQL {result['queries']:5.1f}"
+            f"  ошибок {result['errors']}"
+        )
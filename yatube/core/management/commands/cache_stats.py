@@ -0,0 +1,21 @@
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Показывает статистику попаданий и вытеснений кеша"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--alias", default="default")
+
+    def handle(self, *args, **options):
+        backend = caches[options["alias"]]
+        if not hasattr(backend, "get_stats"):
+            self.stderr.write(f"{type(backend).__name__} не ведёт статистику")
+            return
+        stats = backend.get_stats()
+        lookups = stats["hits"] + stats["misses"]
+        ratio = stats["hits"] / lookups if lookups else 0
+        for name, value in stats.items():
+            self.stdout.write(f"{name}: {value}")
+        self.stdout.write(f"hit_ratio: {ratio:.3f}")
@@ -0,0 +1,67 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import jobs, metrics
+
+_stopping = multiprocessing.Event()
+
+
+def _stop(signum, frame):
+    _stopping.set()
+
+
+def _work(burst, total):
+    done = jobs.work(stop=_stopping.is_set, burst=burst)
+    metrics.collector.flush()
+    with total.get_lock():
+        total.value += done
+
+
+class Command(BaseCommand):
+    help = "Выполняет фоновые задания из очереди в нескольких процессах"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes", type=int, default=1,
+            help="сколько процессов-воркеров запустить",
+        )
+        parser.add_argument(
+            "--burst", action="store_true",
+            help="завершиться, когда готовых заданий не останется",
+        )
+
+    def handle(self, *args, **options):
+        # SIGTERM и Ctrl+C: доделать текущее задание и выйти; событие
+        # общее с дочерними процессами
+        _stopping.clear()
+        previous = {
+            number: signal.signal(number, _stop)
+            for number in (signal.SIGTERM, signal.SIGINT)
+        }
+        context = multiprocessing.get_context("fork")
+        total = context.Value("i", 0)
+        try:
+            if options["processes"] <= 1:
+                _work(options["burst"], total)
+            else:
+                # дочерние процессы откроют свои соединения
+                connections.close_all()
+                workers = [
+                    context.Process(
+                        target=_work, args=(options["burst"], total)
+                    )
+                    for _ in range(options["processes"])
+                ]
+                for worker in workers:
+                    worker.start()
+                for worker in workers:
+                    worker.join()
+        finally:
+            for number, handler in previous.items():
+                signal.signal(number, handler)
+        self.stdout.write(self.style.SUCCESS(
+            f"Выполнено заданий: {total.value}"
+        ))
@@ -0,0 +1,131 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from multiprocessing import get_context
+
+from django.core.management.base import BaseCommand
+
+from core.benchmark import percentile
+from core.sqlite import apply_pragmas, pragmas
+
+# настройки SQLite по умолчанию: журнал отката и полная синхронизация
+DEFAULTS = {"journal_mode": "delete", "synchronous": "full"}
+AUTHORS = 1000
+
+
+def _connect(path, values):
+    db = sqlite3.connect(path, timeout=5, isolation_level=None)
+    apply_pragmas(db, values)
+    return db
+
+
+def _prepare(path, rows):
+    db = sqlite3.connect(path, isolation_level=None)
+    db.execute(
+        "CREATE TABLE post (id INTEGER PRIMARY KEY, author_id INTEGER,"
+        " text TEXT, pub_date REAL)"
+    )
+    db.execute("CREATE INDEX post_author ON post (author_id, pub_date)")
+    rng = random.Random(0)
+    db.execute("BEGIN")
+    db.executemany(
+        "INSERT INTO post (author_id, text, pub_date) VALUES (?, ?, ?)",
+        ((rng.randrange(AUTHORS), "x" * 200, i) for i in range(rows)),
+    )
+    db.execute("COMMIT")
+    db.close()
+
+
+def _reader(path, values, duration, seed):
+    db = _connect(path, values)
+    rng = random.Random(seed)
+    timings, errors = [], 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            db.execute(
+                "SELECT id, text FROM post WHERE author_id = ?"
+                " ORDER BY pub_date DESC LIMIT 10",
+                (rng.randrange(AUTHORS),),
+            ).fetchall()
+        except sqlite3.OperationalError:
+            errors += 1
+            continue
+        timings.append(time.perf_counter() - started)
+    return timings, errors
+
+
+def _writer(path, values, duration, burst):
+    db = _connect(path, values)
+    written, errors = 0, 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany(
+                "INSERT INTO post (author_id, text, pub_date)"
+                " VALUES (?, ?, ?)",
+                ((i % AUTHORS, "y" * 200, time.time())
+                 for i in range(burst)),
+            )
+            db.execute("COMMIT")
+            written += burst
+        except sqlite3.OperationalError:
+            errors += 1
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+        time.sleep(0.01)
+    return written, errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает чтение SQLite во время пачек записи с настройками "
+        "по умолчанию и с PRAGMA проекта"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100000)
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--burst", type=int, default=500)
+        parser.add_argument("--duration", type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        for name, values in (("default", DEFAULTS), ("tuned", pragmas())):
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "bench.sqlite3")
+                _prepare(path, options["rows"])
+                result = self.run(path, values, options)
+            self.stdout.write(
+                f"{name:<8} чтений/с {result['reads']:9.0f}"
+                f"  p99 чтения {result['p99']:7.2f} мс"
+                f"  ошибок чтения {result['read_errors']}"
+                f"  записей/с {result['writes']:7.0f}"
+                f"  ошибок записи {result['write_errors']}"
+            )
+        self.stdout.write(self.style.SUCCESS("Замер завершён"))
+
+    @staticmethod
+    def run(path, values, options):
+        duration = options["duration"]
+        with get_context("spawn").Pool(options["readers"] + 1) as pool:
+            writer = pool.apply_async(
+                _writer, (path, values, duration, options["burst"])
+            )
+            readers = [
+                pool.apply_async(_reader, (path, values, duration, seed))
+                for seed in range(options["readers"])
+            ]
+            written, write_errors = writer.get()
+            parts = [reader.get() for reader in readers]
+        timings = [value for part, _ in parts for value in part]
+        return {
+            "reads": len(timings) / duration,
+            "p99": percentile(timings, 0.99) * 1000,
+            "read_errors": sum(errors for _, errors in parts),
+            "writes": written / duration,
+            "write_errors": write_errors,
+        }
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import db_router
+
+
+class Command(BaseCommand):
+    help = "Копирует основную БД SQLite в файлы реплик"
+
+    def handle(self, *args, **options):
+        # метка попадёт в копии: по ней считается их отставание
+        db_router.beat()
+        source = connections["default"]
+        source.ensure_connection()
+        for alias in settings.DATABASE_REPLICAS:
+            target = connections[alias]
+            target.ensure_connection()
+            # backup копирует страницы целиком и сам берёт блокировки
+            source.connection.backup(target.connection)
+            self.stdout.write(self.style.SUCCESS(
+                f"{alias}: скопирована, отставание {db_router.lag(alias)} с"
+            ))
@@ -0,0 +1,270 @@
+"""Метрики в формате Prometheus, общие для всех процессов.
+
+Каждый процесс копит значения в памяти и не чаще раза в
+``FLUSH_INTERVAL`` секунд сбрасывает их в свой файл ``<pid>.json`` в
+``METRICS_DIR`` (после уменьшения gauge — фоновым таймером, даже если
+процесс затих). ``/metrics`` складывает файлы всех процессов; gauge
+учитываются только у живых процессов. Счётчики и гистограммы
+завершившихся процессов складываются в ``retired.json``, а их файлы
+удаляются, поэтому каталог не растёт от перезапусков воркеров.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+FLUSH_INTERVAL = 1.0
+RETIRED = "retired.json"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+METRICS = {
+    "yatube_requests_total": (COUNTER, "Обработанные запросы"),
+    "yatube_request_duration_seconds": (HISTOGRAM, "Время ответа"),
+    "yatube_requests_in_flight": (GAUGE, "Запросы в обработке"),
+    "yatube_db_queries_total": (COUNTER, "Запросы к БД"),
+    "yatube_db_duration_seconds": (
+        HISTOGRAM, "Время SQL-запросов одного HTTP-запроса"
+    ),
+    "yatube_feed_cache_total": (COUNTER, "Обращения к кешу лент"),
+    "yatube_thumbnail_duration_seconds": (
+        HISTOGRAM, "Время нарезки превью одной картинки"
+    ),
+    "yatube_cache_operations": (
+        GAUGE, "Счётчики общего кеша: попадания, промахи, вытеснения"
+    ),
+    "yatube_jobs_total": (COUNTER, "Выполненные фоновые задания по исходу"),
+    "yatube_job_wait_seconds": (
+        HISTOGRAM, "Сколько задание ждало воркера после готовности"
+    ),
+    "yatube_job_duration_seconds": (HISTOGRAM, "Время выполнения задания"),
+    "yatube_job_queue_depth": (GAUGE, "Задания в очереди по состоянию"),
+    "yatube_job_queue_age_seconds": (
+        GAUGE, "Сколько ждёт самое старое готовое задание"
+    ),
+}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class Collector:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # снимки пишутся по одному: более старый не затрёт новый
+        self._flush_lock = threading.Lock()
+        self._values = defaultdict(float)
+        self._histograms = {}
+        self._flushed = 0.0
+        self._timer = None
+
+    def inc(self, name, amount=1, **labels):
+        with self._lock:
+            self._values[_key(name, labels)] += amount
+        self._maybe_flush()
+
+    def dec(self, name, amount=1, **labels):
+        with self._lock:
+            self._values[_key(name, labels)] -= amount
+            # затихший после запроса процесс иначе так и показывал бы
+            # его в обработке; сброс — в фоне, не в ответе
+            if self._timer is None:
+                self._timer = threading.Timer(
+                    FLUSH_INTERVAL, self._delayed_flush
+                )
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _delayed_flush(self):
+        with self._lock:
+            self._timer = None
+        self.flush()
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            counts, total, count = self._histograms.get(
+                key, ([0] * len(BUCKETS), 0.0, 0)
+            )
+            counts = [
+                bucket + (value <= bound)
+                for bucket, bound in zip(counts, BUCKETS)
+            ]
+            self._histograms[key] = counts, total + value, count + 1
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if time.monotonic() - self._flushed > FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                self._flushed = time.monotonic()
+                data = {
+                    "values": [
+                        [name, labels, value]
+                        for (name, labels), value in self._values.items()
+                    ],
+                    "histograms": [
+                        [name, labels, counts, total, count]
+                        for (name, labels), (counts, total, count)
+                        in self._histograms.items()
+                    ],
+                }
+            directory = settings.METRICS_DIR
+            os.makedirs(directory, exist_ok=True)
+            _dump(os.path.join(directory, f"{os.getpid()}.json"), data)
+
+
+def _dump(path, data):
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        json.dump(data, file, ensure_ascii=False)
+    os.replace(temporary, path)
+
+
+collector = Collector()
+inc = collector.inc
+dec = collector.dec
+observe = collector.observe
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _snapshots():
+    directory = settings.METRICS_DIR
+    if not os.path.isdir(directory):
+        return
+    for filename in os.listdir(directory):
+        pid, extension = os.path.splitext(filename)
+        if extension != ".json" or not pid.isdigit():
+            continue
+        try:
+            with open(os.path.join(directory, filename),
+                      encoding="utf-8") as file:
+                yield int(pid), json.load(file)
+        except (OSError, ValueError):
+            continue
+
+
+def _merge(values, histograms, data, gauges=True):
+    for name, labels, value in data["values"]:
+        if METRICS[name][0] == GAUGE and not gauges:
+            continue
+        values[name, tuple(map(tuple, labels))] += value
+    for name, labels, counts, total, count in data["histograms"]:
+        key = name, tuple(map(tuple, labels))
+        previous = histograms.get(key, ([0] * len(BUCKETS), 0.0, 0))
+        histograms[key] = (
+            [a + b for a, b in zip(previous[0], counts)],
+            previous[1] + total,
+            previous[2] + count,
+        )
+
+
+def _retired(directory):
+    try:
+        with open(os.path.join(directory, RETIRED), encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {"values": [], "histograms": []}
+
+
+def _retire(directory):
+    """Сложить снимки завершившихся процессов в ``retired.json``."""
+    dead = [(pid, data) for pid, data in _snapshots() if not _alive(pid)]
+    if not dead:
+        return
+    with open(os.path.join(directory, ".lock"), "w") as lock:
+        # /metrics могут одновременно открыть несколько воркеров
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        values, histograms = defaultdict(float), {}
+        _merge(values, histograms, _retired(directory))
+        paths = []
+        for pid, data in dead:
+            path = os.path.join(directory, f"{pid}.json")
+            # его уже сложил другой воркер
+            if not os.path.exists(path):
+                continue
+            _merge(values, histograms, data, gauges=False)
+            paths.append(path)
+        _dump(os.path.join(directory, RETIRED), {
+            "values": [
+                [name, labels, value]
+                for (name, labels), value in values.items()
+            ],
+            "histograms": [
+                [name, labels, *histogram]
+                for (name, labels), histogram in histograms.items()
+            ],
+        })
+        for path in paths:
+            os.remove(path)
+
+
+def collect():
+    """Значения всех процессов: ``(values, histograms)``."""
+    collector.flush()
+    directory = settings.METRICS_DIR
+    _retire(directory)
+    values = defaultdict(float)
+    histograms = {}
+    for pid, data in _snapshots():
+        _merge(values, histograms, data, gauges=_alive(pid))
+    _merge(values, histograms, _retired(directory))
+    return values, histograms
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def render(values, histograms):
+    """Текст в формате экспозиции Prometheus 0.0.4."""
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind != HISTOGRAM:
+            for (metric, labels), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(labels)} {value:g}")
+            continue
+        for (metric, labels), (counts, total, count) in sorted(
+            histograms.items()
+        ):
+            if metric != name:
+                continue
+            for bound, bucket in zip(BUCKETS, counts):
+                lines.append(
+                    f"{name}_bucket{_labels(labels, le=f'{bound:g}')}"
+                    f" {bucket}"
+                )
+            lines.append(f"{name}_bucket{_labels(labels, le='+Inf')} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {total:g}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
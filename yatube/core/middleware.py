@@ -0,0 +1,144 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import db_router, metrics
+from .profiling import Profile, QueryBudgetExceeded, activate
+
+logger = logging.getLogger("core.profiling")
+
+
+class ProfilingMiddleware:
+    """Профиль каждого запроса в заголовке Server-Timing и в логе.
+
+    Должен стоять первым в ``MIDDLEWARE``, чтобы учесть запросы к БД
+    всех остальных middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = Profile()
+        request.profile = profile
+        activate(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(profile.record_query)
+                    )
+                response = self.get_response(request)
+                if profile.view_started is not None:
+                    profile.view_ms = (
+                        time.perf_counter() - profile.view_started
+                    ) * 1000
+        finally:
+            activate(None)
+        self.check_budget(request, getattr(request, "query_budget", None))
+        response["Server-Timing"] = self.server_timing(profile)
+        self.log(request, response, profile)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, "query_budget", None)
+        request.profile.view_started = time.perf_counter()
+
+    @staticmethod
+    def server_timing(profile):
+        return ", ".join((
+            f'db;dur={profile.sql_ms:.1f};desc="{profile.queries} queries"',
+            f"tpl;dur={profile.template_ms:.1f}",
+            f"view;dur={profile.view_ms:.1f}",
+            f"total;dur={profile.total_ms:.1f}",
+        ))
+
+    @staticmethod
+    def check_budget(request, budget):
+        problems = budget.violations(request.profile) if budget else []
+        if not problems:
+            return
+        message = f"{request.path}: {', '.join(problems)}"
+        if settings.QUERY_BUDGET_RAISE:
+            raise QueryBudgetExceeded(message)
+        logger.warning("Превышен бюджет запросов: %s", message)
+
+    @staticmethod
+    def log(request, response, profile):
+        match = request.resolver_match
+        duplicates = profile.duplicates(settings.PROFILE_DUPLICATE_THRESHOLD)
+        logger.info(json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "queries": profile.queries,
+            "sql_ms": round(profile.sql_ms, 1),
+            "template_ms": round(profile.template_ms, 1),
+            "view_ms": round(profile.view_ms, 1),
+            "total_ms": round(profile.total_ms, 1),
+            "duplicates": duplicates,
+        }, ensure_ascii=False))
+
+
+class MetricsMiddleware:
+    """Время ответа, запросы к БД и число запросов в обработке по view.
+
+    Стоит перед ``ProfilingMiddleware`` и берёт из его профиля SQL.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics.inc("yatube_requests_in_flight")
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.dec("yatube_requests_in_flight")
+        match = request.resolver_match
+        view = match.view_name if match else "unknown"
+        metrics.inc(
+            "yatube_requests_total", view=view, status=response.status_code
+        )
+        metrics.observe(
+            "yatube_request_duration_seconds",
+            time.perf_counter() - started,
+            view=view,
+        )
+        profile = getattr(request, "profile", None)
+        if profile is not None:
+            metrics.inc("yatube_db_queries_total", profile.queries, view=view)
+            metrics.observe(
+                "yatube_db_duration_seconds", profile.sql_ms / 1000, view=view
+            )
+        return response
+
+
+class ReplicaMiddleware:
+    """Безопасные запросы читают с реплик, после записи — с основной БД."""
+
+    SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        safe = request.method in self.SAFE_METHODS
+        pinned = settings.REPLICA_PIN_COOKIE in request.COOKIES
+        with db_router.reading_from_replicas(safe and not pinned):
+            response = self.get_response(request)
+        if not safe and response.status_code < 400 and db_router.replicas():
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                "1",
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
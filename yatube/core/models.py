@@ -0,0 +1,33 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """Фоновое задание, см. ``core.jobs``."""
+
+    name = models.CharField("Задание", max_length=200)
+    payload = models.TextField("Аргументы в JSON")
+    created = models.DateTimeField("Поставлено", auto_now_add=True)
+    run_at = models.DateTimeField("Выполнить не раньше", default=timezone.now)
+    attempts = models.PositiveIntegerField("Попыток", default=0)
+    max_attempts = models.PositiveIntegerField("Попыток не больше", default=5)
+    locked_by = models.CharField("Воркер", max_length=100, blank=True)
+    last_error = models.TextField("Последняя ошибка", blank=True)
+    failed = models.BooleanField("Попытки исчерпаны", default=False)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["failed", "run_at"], name="job_ready_idx"),
+        ]
+
+
+class Heartbeat(models.Model):
+    """Метка последней записи в основную БД, см. ``core.db_router``.
+
+    Строка одна; реплика, скопированная после записи, несёт ту же метку.
+    """
+
+    beat = models.DateTimeField("Последняя запись")
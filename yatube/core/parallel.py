@@ -0,0 +1,24 @@
+"""Пачки считают процессы, а пишет в SQLite один основной процесс."""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+def imap(function, tasks, workers=1):
+    """Как ``map``, но в ``workers`` процессах.
+
+    Результаты отдаются по порядку задач, а в работе одновременно не
+    больше ``2 * workers`` задач, поэтому задачи можно брать из
+    генератора по миллионам строк без роста памяти. ``function`` не
+    должна обращаться к БД: процессы наследуют соединения родителя.
+    """
+    if workers <= 1:
+        yield from map(function, tasks)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(function, task))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,140 @@
+"""Профиль запроса: SQL, шаблоны и бюджеты запросов к БД.
+
+``ProfilingMiddleware`` заводит ``Profile`` на каждый запрос и
+складывает в него время и число SQL-запросов (через
+``execute_wrapper``) и время отрисовки шаблонов (через
+``TimedDjangoTemplates``). Одинаковые с точностью до чисел запросы,
+повторённые ``PROFILE_DUPLICATE_THRESHOLD`` раз, считаются признаком
+N+1. Бюджет view задаётся декоратором ``query_budget``.
+"""
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.template.backends.django import DjangoTemplates, Template
+
+NUMBER_RE = re.compile(r"\b\d+\b")
+PLACEHOLDERS_RE = re.compile(r"\((?:%s, )+%s\)")
+
+_local = threading.local()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class Budget:
+    def __init__(self, queries=None, sql_ms=None):
+        self.queries = queries
+        self.sql_ms = sql_ms
+
+    def violations(self, profile):
+        problems = []
+        if self.queries is not None and profile.queries > self.queries:
+            problems.append(
+                f"запросов к БД {profile.queries} при бюджете {self.queries}"
+            )
+        if self.sql_ms is not None and profile.sql_ms > self.sql_ms:
+            problems.append(
+                f"время SQL {profile.sql_ms:.1f} мс"
+                f" при бюджете {self.sql_ms} мс"
+            )
+        return problems
+
+
+def query_budget(queries=None, sql_ms=None):
+    """Объявить бюджет view: число запросов к БД и/или время SQL в мс."""
+    def decorator(view):
+        # functools.wraps переносит атрибут и через login_required
+        view.query_budget = Budget(queries, sql_ms)
+        return view
+    return decorator
+
+
+def signature(sql):
+    """SQL без чисел и длины списков IN: одинаковый у повторов N+1."""
+    return NUMBER_RE.sub("?", PLACEHOLDERS_RE.sub("(...)", sql))
+
+
+class Profile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.view_started = None
+        self.view_ms = 0.0
+        self.signatures = Counter()
+        self._rendering = 0
+        self._untracked = 0
+
+    @property
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def duplicates(self, threshold):
+        return {
+            sql: count for sql, count in self.signatures.items()
+            if count >= threshold
+        }
+
+    def record_query(self, execute, sql, params, many, context):
+        if self._untracked:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_ms += (time.perf_counter() - started) * 1000
+            self.queries += 1
+            self.signatures[signature(sql)] += 1
+
+
+def current():
+    """Профиль текущего запроса или ``None`` вне запроса."""
+    return getattr(_local, "profile", None)
+
+
+def activate(profile):
+    _local.profile = profile
+
+
+@contextmanager
+def untracked():
+    """Не учитывать служебные запросы (проверки реплик и т. п.)."""
+    profile = current()
+    if profile is None:
+        yield
+        return
+    profile._untracked += 1
+    try:
+        yield
+    finally:
+        profile._untracked -= 1
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        profile = current()
+        if profile is None or profile._rendering:
+            return super().render(context, request)
+        profile._rendering += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile._rendering -= 1
+            profile.template_ms += (time.perf_counter() - started) * 1000
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """``DjangoTemplates``, который замеряет время отрисовки шаблонов."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
@@ -0,0 +1,43 @@
+"""Проверка планов запросов SQLite.
+
+``full_scans`` прогоняет запросы через ``EXPLAIN QUERY PLAN`` и
+возвращает шаги, на которых SQLite читает таблицу целиком, а по
+желанию и шаги с сортировкой во временном B-дереве вместо обхода
+индекса.
+"""
+import re
+
+from django.db import connection
+
+# «SCAN posts_post» без «USING ... INDEX»; виртуальные таблицы (FTS5)
+# и подзапросы сюда не попадают
+FULL_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+TEMP_SORT_RE = re.compile(r"^USE TEMP B-TREE FOR (?:ORDER|GROUP) BY$")
+
+
+def explain(sql, params=(), using=connection):
+    with using.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(queries, using=connection, allowed=(), sorts=False):
+    """Плохие шаги планов для ``queries`` из ``CaptureQueriesContext``.
+
+    Возвращает пары ``(sql, шаг)``. Таблицы из ``allowed`` (маленькие
+    справочники) можно читать целиком. С ``sorts=True`` плохой считается
+    и сортировка: лента должна идти по индексу, а не сортироваться.
+    """
+    problems = []
+    for query in queries:
+        sql = query["sql"]
+        if not sql.lstrip().upper().startswith("SELECT"):
+            continue
+        # в captured_queries параметры уже подставлены в текст
+        for step in explain(sql, using=using):
+            scan = FULL_SCAN_RE.match(step)
+            if scan and scan.group(1) in allowed:
+                continue
+            if scan or sorts and TEMP_SORT_RE.match(step):
+                problems.append((sql, step))
+    return problems
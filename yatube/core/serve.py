@@ -0,0 +1,154 @@
+"""Отдача статики и загрузок самим приложением, без внешнего CDN.
+
+Файл отдаётся ``FileResponse``: WSGI-сервер с ``wsgi.file_wrapper``
+(gunicorn, uWSGI) передаёт его через ``sendfile`` без копирования в
+процесс. Поддерживаются условные запросы (ETag и Last-Modified),
+один диапазон ``Range`` и заранее сжатые соседи ``.br``/``.gz``, которые
+пишет ``collectstatic`` (см. ``core.storage``).
+
+Имена с хешем содержимого никогда не меняют содержимое, поэтому их
+кешируют на год с ``immutable``; остальные браузер перепроверяет.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+# порядок предпочтения, если клиент принимает оба
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class _Slice:
+    """Читает из файла не больше ``length`` байт, начиная с ``start``.
+
+    ``fileno`` нет намеренно: ``sendfile`` отправил бы файл до конца.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.left = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.left:
+            size = self.left
+        data = self.file.read(size)
+        self.left -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def _accepted_encodings(header):
+    """Кодировки из ``Accept-Encoding`` без отвергнутых через ``q=0``."""
+    accepted = set()
+    for part in header.split(","):
+        name, *params = (item.strip() for item in part.split(";"))
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            accepted.add(name.lower())
+    return accepted
+
+
+def _negotiate(request, full_path):
+    """Сжатый сосед файла, который примет клиент: (кодировка, путь)."""
+    accepted = _accepted_encodings(
+        request.META.get("HTTP_ACCEPT_ENCODING", "")
+    )
+    for name, suffix in ENCODINGS:
+        if name in accepted and os.path.isfile(full_path + suffix):
+            return name, full_path + suffix
+    return None, full_path
+
+
+def _range(header, size):
+    """Границы диапазона включительно; ``False``, если он вне файла."""
+    match = RANGE_RE.match(header)
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def serve(request, path, document_root, immutable=None, compressed=False):
+    """Отдать ``path`` из ``document_root``.
+
+    ``immutable(path)`` решает, можно ли кешировать файл навсегда;
+    с ``compressed`` ищутся сжатые соседи файла.
+    """
+    path = posixpath.normpath(path).lstrip("/")
+    # выход за document_root — SuspiciousFileOperation, ответ 400
+    full_path = safe_join(document_root, path)
+    if not os.path.isfile(full_path):
+        raise Http404("Файл не найден")
+    content_type = mimetypes.guess_type(full_path)[0]
+    encoding = None
+    if compressed:
+        encoding, full_path = _negotiate(request, full_path)
+    stat = os.stat(full_path)
+    variant = f"-{encoding}" if encoding else ""
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{variant}"'
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime)
+    )
+    if response is None:
+        response = _file_response(request, full_path, stat.st_size, etag)
+        if response.status_code != 416:
+            response["Content-Type"] = (
+                content_type or "application/octet-stream"
+            )
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    response["Cache-Control"] = (
+        IMMUTABLE if immutable and immutable(path) else REVALIDATE
+    )
+    if encoding:
+        response["Content-Encoding"] = encoding
+    if compressed:
+        patch_vary_headers(response, ["Accept-Encoding"])
+    return response
+
+
+def _file_response(request, full_path, size, etag):
+    header = request.META.get("HTTP_RANGE", "")
+    if_range = request.META.get("HTTP_IF_RANGE")
+    byte_range = _range(header, size) if if_range in (None, etag) else None
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+    file = open(full_path, "rb")
+    if byte_range is None:
+        response = FileResponse(file)
+        response["Content-Length"] = size
+    else:
+        start, end = byte_range
+        response = FileResponse(_Slice(file, start, end - start + 1))
+        response.status_code = 206
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = end - start + 1
+    response["Accept-Ranges"] = "bytes"
+    return response
@@ -0,0 +1,62 @@
+import os
+import sqlite3
+import threading
+
+from django.conf import settings
+
+# значения по умолчанию для рабочей базы; переопределяются SQLITE_PRAGMAS
+PRAGMAS = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "busy_timeout": 5000,
+    "cache_size": -64000,
+    "mmap_size": 256 * 2 ** 20,
+    "temp_store": "memory",
+}
+
+
+def pragmas():
+    return {**PRAGMAS, **getattr(settings, "SQLITE_PRAGMAS", {})}
+
+
+def apply_pragmas(db, values=None):
+    """Выполнить ``PRAGMA`` для соединения ``sqlite3``."""
+    for name, value in (pragmas() if values is None else values).items():
+        db.execute(f"PRAGMA {name} = {value}")
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Обработчик ``connection_created``: настройка соединений Django."""
+    if connection.vendor == "sqlite":
+        apply_pragmas(connection.connection)
+
+
+class LocalConnection:
+    """Соединение с файлом SQLite, своё у каждого потока и процесса.
+
+    После ``fork`` унаследованное соединение не используется: дочерний
+    процесс открывает файл заново.
+    """
+
+    def __init__(self, path, schema=(), timeout=5):
+        self.path = path
+        self.schema = schema
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def get(self):
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None
+            )
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.schema:
+                db.execute(statement)
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
@@ -0,0 +1,119 @@
+"""Хранилища файлов: загрузки по хешу содержимого и сжатая статика.
+
+``HashedStorage`` сохраняет файл под именем
+``<каталог>/ab/cd/abcd…<расширение>``: каталог берётся из ``upload_to``
+поля, а ``abcd…`` — SHA-256 содержимого. Два уровня каталогов по два
+символа держат в каждом каталоге не больше нескольких тысяч файлов даже
+на миллионах картинок. Одинаковые файлы хранятся один раз; файл под
+таким именем никогда не перезаписывается другим содержимым, поэтому
+его можно отдавать с бессрочным кешированием.
+
+Удалять файл, на который ссылаются другие записи, хранилище не умеет:
+за ссылками следит приложение (см. ``posts.jobs.release_image``). Чтобы
+оно видело повторное использование файла, сохранение существующего
+файла обновляет его время изменения.
+"""
+import gzip
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+try:
+    import brotli
+except ImportError:  # необязательная зависимость
+    brotli = None
+
+HASHED_NAME_RE = re.compile(
+    r"(?:^|/)([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}\.\w+$"
+)
+
+COMPRESSIBLE = {
+    ".css", ".html", ".ico", ".js", ".json", ".map", ".svg", ".txt", ".xml",
+}
+
+
+def is_hashed(name):
+    return bool(HASHED_NAME_RE.search(name))
+
+
+def hashed_name(name, content):
+    """Имя для ``content`` в каталоге, который предложен в ``name``."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    key = digest.hexdigest()
+    directory, basename = posixpath.split(name)
+    extension = posixpath.splitext(basename)[1].lower()
+    return posixpath.join(directory, key[:2], key[2:4], key + extension)
+
+
+@deconstructible
+class HashedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # имя всё равно определит содержимое, см. _save
+        return name
+
+    def _save(self, name, content):
+        name = hashed_name(name, content)
+        path = self.path(name)
+        try:
+            # повторная загрузка освежает mtime: release_image не удалит
+            # файл, ссылку на который ещё не записали в БД
+            os.utime(path)
+            return name
+        except FileNotFoundError:
+            pass
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # запись во временный файл и переименование: параллельная
+        # загрузка того же файла не увидит его недописанным
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as file:
+            for chunk in content.chunks():
+                file.write(chunk)
+        os.chmod(file.name, self.file_permissions_mode or 0o644)
+        os.replace(file.name, path)
+        return name
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Статика с хешем в имени и заранее сжатыми копиями.
+
+    ``collectstatic`` кладёт рядом с текстовыми файлами ``.gz`` и, если
+    установлен пакет ``brotli``, ``.br``; ``core.serve`` отдаёт их
+    клиентам, которые такое сжатие принимают.
+    """
+
+    def stored_name(self, name):
+        # файла нет среди собранных: ссылка без хеша, как в DEBUG, а не
+        # ошибка на каждой странице
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for name in {*self.hashed_files, *self.hashed_files.values()}:
+            if posixpath.splitext(name)[1] in COMPRESSIBLE:
+                self.compress(name)
+
+    def compress(self, name):
+        path = self.path(name)
+        with open(path, "rb") as file:
+            data = file.read()
+        variants = [(".gz", gzip.compress(data, 9, mtime=0))]
+        if brotli is not None:
+            variants.append((".br", brotli.compress(data)))
+        for suffix, compressed in variants:
+            # сжатие, которое не окупается, не отдаём
+            if len(compressed) < len(data):
+                with open(path + suffix, "wb") as file:
+                    file.write(compressed)
@@ -0,0 +1,63 @@
+"""Окружение, в котором идут тесты.
+
+Тесты не трогают рабочие файлы проекта: кеш, загрузки, индекс превью и
+снимки метрик живут во временном каталоге, который удаляется после
+прогона. Превью режутся сразу, а не в фоновом пуле: иначе поток
+дописывал бы файлы уже после теста, когда его ``MEDIA_ROOT`` удалён.
+Превышенный бюджет запросов роняет тест, а профиль каждого запроса не
+пишется в лог.
+
+``manage.py test`` включает окружение через ``TEST_RUNNER``, pytest —
+фикстурой из ``tests/conftest.py``.
+"""
+import copy
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.test import runner
+from django.test.utils import override_settings
+
+
+def test_settings(directory):
+    """Настройки на время тестов; файлы хранилищ — в ``directory``."""
+    caches = copy.deepcopy(settings.CACHES)
+    caches["default"]["LOCATION"] = os.path.join(directory, "cache.sqlite3")
+    return {
+        "CACHES": caches,
+        "MEDIA_ROOT": os.path.join(directory, "media"),
+        "THUMBNAIL_KVSTORE_PATH": os.path.join(
+            directory, "thumbnails.sqlite3"
+        ),
+        "THUMBNAIL_ALWAYS_EAGER": True,
+        "METRICS_DIR": os.path.join(directory, "metrics"),
+        "QUERY_BUDGET_RAISE": True,
+    }
+
+
+@contextmanager
+def test_environment():
+    directory = tempfile.mkdtemp(prefix="yatube-tests-")
+    profile_log = logging.getLogger("core.profiling")
+    level = profile_log.level
+    profile_log.setLevel(logging.WARNING)
+    try:
+        with override_settings(**test_settings(directory)):
+            yield
+    finally:
+        profile_log.setLevel(level)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class DiscoverRunner(runner.DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._environment = ExitStack()
+        self._environment.enter_context(test_environment())
+
+    def teardown_test_environment(self, **kwargs):
+        self._environment.close()
+        super().teardown_test_environment(**kwargs)
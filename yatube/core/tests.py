@@ -0,0 +1,498 @@
+import gzip
+import json
+import os
+import re
+import tempfile
+import time
+from io import StringIO
+from multiprocessing import get_context
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.apps import apps
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import (
+    SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.urls import path
+from django.utils import timezone
+
+from . import benchmark, db_router, jobs, metrics
+from .cache import SQLiteCache
+from .profiling import QueryBudgetExceeded, query_budget
+
+
+@query_budget(queries=2)
+def repeated_queries(request):
+    with connection.cursor() as cursor:
+        for number in range(3):
+            cursor.execute(f"SELECT {number}")
+    return HttpResponse()
+
+
+urlpatterns = [path("repeated/", repeated_queries, name="repeated")]
+
+
+done_jobs = []
+
+
+@jobs.job(max_attempts=2)
+def remember(value):
+    if value == "сбой":
+        raise ValueError(value)
+    done_jobs.append(value)
+
+
+def _write_from_child(path):
+    SQLiteCache(path, {}).set("shared", "из другого процесса")
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = f"{self.directory.name}/cache.sqlite3"
+        self.cache = SQLiteCache(self.path, {})
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_basic_operations(self):
+        """Запись, чтение, add, incr и истечение срока"""
+        cache = self.cache
+        cache.set("key", {"a": 1})
+        self.assertEqual(cache.get("key"), {"a": 1})
+        self.assertFalse(cache.add("key", "другое"))
+        self.assertTrue(cache.add("new", 1))
+        self.assertEqual(cache.incr("new", 2), 3)
+        with self.assertRaises(ValueError):
+            cache.incr("missing")
+        cache.set("short", 1, timeout=0.05)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("short"))
+        self.assertTrue(cache.add("short", 2))
+        self.assertEqual(cache.get_many(["key", "new", "missing"]),
+                         {"key": {"a": 1}, "new": 3})
+        cache.delete("key")
+        self.assertFalse(cache.has_key("key"))
+
+    def test_shared_between_processes(self):
+        """Запись из другого процесса видна сразу"""
+        process = get_context("spawn").Process(
+            target=_write_from_child, args=(self.path,)
+        )
+        process.start()
+        process.join()
+        self.assertEqual(self.cache.get("shared"), "из другого процесса")
+
+    def test_lru_eviction_and_stats(self):
+        """Вытесняются давно не читавшиеся записи, статистика ведётся"""
+        cache = SQLiteCache(self.path, {"OPTIONS": {"MAX_ENTRIES": 10}})
+        cache.CULL_EVERY = 1
+        cache.ACCESS_RESOLUTION = 0
+        cache.set("hot", 1)
+        for i in range(20):
+            cache.get("hot")
+            cache.set(f"cold{i}", i)
+        cache.get("missing")
+        stats = cache.get_stats()
+        self.assertEqual(cache.get("hot"), 1)
+        self.assertLessEqual(stats["entries"], 10)
+        self.assertGreater(stats["evictions"], 0)
+        self.assertEqual(stats["hits"], 20)
+        self.assertEqual(stats["misses"], 1)
+
+
+class BenchmarkTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_run_and_compare(self):
+        """Прогон сохраняет результаты и ловит регрессию относительно них"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "baseline.json")
+            call_command(
+                "benchmark", "--seed", "--users", "5", "--groups", "2",
+                "--posts", "20", "--comments", "5", "--follows-per-user", "2",
+                "--requests", "3", "--concurrency", "1", "--save", path,
+                stdout=StringIO()
+            )
+            with open(path, encoding="utf-8") as file:
+                results = json.load(file)
+        self.assertEqual(set(results), set(
+            "index group_posts profile post_detail follow_index "
+            "post_create add_comment".split()
+        ))
+        for name, result in results.items():
+            with self.subTest(scenario=name):
+                self.assertEqual(result["requests"], 3)
+                self.assertEqual(result["errors"], 0)
+        slower = {
+            name: dict(result, p95=result["p95"] * 2 + 1)
+            for name, result in results.items()
+        }
+        self.assertEqual(benchmark.compare(results, results), [])
+        self.assertEqual(len(benchmark.compare(results, slower)), 7)
+
+    def test_unknown_scenario(self):
+        with self.assertRaises(CommandError):
+            call_command("benchmark", "--scenarios", "nope")
+
+
+@override_settings(ROOT_URLCONF="core.tests")
+class ProfilingMiddlewareTest(SimpleTestCase):
+    databases = {"default"}
+
+    @override_settings(QUERY_BUDGET_RAISE=False)
+    def test_profile_header_and_log(self):
+        """Профиль попадает в Server-Timing и в лог, повторы замечены"""
+        with self.assertLogs("core.profiling", "INFO") as logs:
+            response = self.client.get("/repeated/")
+        self.assertIn('desc="3 queries"', response["Server-Timing"])
+        self.assertIn("total;dur=", response["Server-Timing"])
+        self.assertIn("бюджет", logs.output[0])
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record["view"], "repeated")
+        self.assertEqual(record["queries"], 3)
+        self.assertEqual(record["duplicates"], {"SELECT ?": 3})
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_budget_fails_in_tests(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get("/repeated/")
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings = override_settings(METRICS_DIR=self.directory.name)
+        self.settings.enable()
+        metrics.collector.__init__()
+
+    def tearDown(self):
+        self.settings.disable()
+        self.directory.cleanup()
+
+    def write_snapshot(self, pid, values):
+        with open(os.path.join(self.directory.name, f"{pid}.json"), "w",
+                  encoding="utf-8") as file:
+            json.dump({"values": values, "histograms": []}, file)
+
+    def test_finished_request_leaves_in_flight(self):
+        """Завершённый запрос пропадает из снимка затихшего процесса"""
+        path = os.path.join(self.directory.name, f"{os.getpid()}.json")
+        in_flight = ["yatube_requests_in_flight", [], 0]
+        with mock.patch.object(metrics, "FLUSH_INTERVAL", 0.01):
+            self.client.get("/")
+            for _ in range(100):
+                time.sleep(0.01)
+                with open(path, encoding="utf-8") as file:
+                    if in_flight in json.load(file)["values"]:
+                        return
+        self.fail("В снимке процесса остался запрос в обработке")
+
+    def test_metrics_endpoint(self):
+        """Метрики размечены по имени URL и складываются по процессам"""
+        cache.clear()
+        self.client.get("/")
+        # другой живой воркер и давно завершившийся процесс
+        self.write_snapshot(os.getppid(), [
+            ["yatube_db_queries_total", [["view", "posts:home_page"]], 5],
+            ["yatube_requests_in_flight", [], 2],
+        ])
+        self.write_snapshot(999999999, [
+            ["yatube_db_queries_total", [["view", "posts:home_page"]], 1],
+            ["yatube_requests_in_flight", [], 7],
+        ])
+        response = self.client.get("/metrics")
+        self.assertEqual(
+            response["Content-Type"],
+            "text/plain; version=0.0.4; charset=utf-8"
+        )
+        text = response.content.decode()
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:home_page",le="+Inf"} 1', text
+        )
+        self.assertIn('yatube_feed_cache_total{result="miss"} 1', text)
+        self.assertIn("yatube_requests_in_flight 3", text)
+        queries = int(re.search(
+            r'yatube_db_queries_total\{view="posts:home_page"\} (\d+)', text
+        ).group(1))
+        # счётчики завершившихся процессов не пропадают
+        self.assertGreaterEqual(queries, 5 + 1 + 1)
+        # и складываются в retired.json один раз
+        self.assertFalse(os.path.exists(
+            os.path.join(self.directory.name, "999999999.json")
+        ))
+        text = self.client.get("/metrics").content.decode()
+        self.assertIn("yatube_requests_in_flight 3", text)
+        self.assertIn(
+            f'yatube_db_queries_total{{view="posts:home_page"}} {queries}',
+            text
+        )
+
+
+class SQLitePragmasTest(TestCase):
+    def test_connection_is_tuned(self):
+        """Соединения Django открываются с PRAGMA из core.sqlite"""
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA temp_store")
+            self.assertEqual(cursor.fetchone()[0], 2)
+            cursor.execute("PRAGMA cache_size")
+            self.assertEqual(cursor.fetchone()[0], -64000)
+
+
+@override_settings(DATABASE_REPLICAS=["replica"], REPLICA_CHECK_INTERVAL=0)
+class ReplicaRouterTest(TransactionTestCase):
+    """Реплика — временный файл, который заполняет sync_replicas."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.databases["replica"] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.path.join(cls.directory.name, "replica.sqlite3"),
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        connections["replica"].close()
+        delattr(connections._connections, "replica")
+        del connections.databases["replica"]
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.User = apps.get_model("auth", "User")
+        self.Post = apps.get_model("posts", "Post")
+        self.user = self.User.objects.create_user(username="author")
+        self.post = self.Post.objects.create(author=self.user, text="Пост")
+
+    def sync(self):
+        call_command("sync_replicas", stdout=StringIO())
+
+    def test_lagging_replica_leaves_rotation(self):
+        """Отставшая реплика не используется, догнавшая — используется"""
+        self.sync()
+        with db_router.reading_from_replicas():
+            self.assertEqual(self.Post.objects.all().db, "replica")
+        db_router.beat()
+        with db_router.reading_from_replicas():
+            with self.assertLogs("core.db_router", "WARNING"):
+                self.assertEqual(self.Post.objects.all().db, "default")
+        self.sync()
+        with db_router.reading_from_replicas():
+            self.assertEqual(self.Post.objects.all().db, "replica")
+        self.assertEqual(self.Post.objects.all().db, "default")
+
+    def test_any_write_moves_heartbeat(self):
+        """Запись мимо запросов и заданий (команды, update) тоже видна"""
+        self.sync()
+        self.Post.objects.update(text="Изменён")
+        with db_router.reading_from_replicas():
+            with self.assertLogs("core.db_router", "WARNING"):
+                self.assertEqual(self.Post.objects.all().db, "default")
+
+    def test_unknown_lag(self):
+        """Без метки основной БД отставание неизвестно"""
+        self.sync()
+        apps.get_model("core", "Heartbeat").objects.all().delete()
+        self.assertIsNone(db_router.lag("replica"))
+        with db_router.reading_from_replicas():
+            with self.assertLogs("core.db_router", "WARNING"):
+                self.assertEqual(self.Post.objects.all().db, "default")
+
+    def test_primary_models_and_reads_after_write(self):
+        """Сессии и пользователи и чтение после записи — с основной БД"""
+        self.sync()
+        with db_router.reading_from_replicas():
+            self.assertEqual(self.User.objects.all().db, "default")
+            self.assertEqual(self.Post.objects.all().db, "replica")
+            self.Post.objects.create(author=self.user, text="Новый")
+            self.assertEqual(self.Post.objects.all().db, "default")
+
+    @override_settings(REPLICA_MAX_LAG=60)
+    def test_author_reads_own_writes(self):
+        """После комментария автор читает с основной БД"""
+        self.sync()
+        client = self.client
+        client.force_login(self.user)
+        response = client.post(
+            f"/posts/{self.post.id}/comment/", {"text": "Свежий"}
+        )
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        self.assertContains(
+            client.get(f"/posts/{self.post.id}/"), "Свежий"
+        )
+        client.cookies.pop(settings.REPLICA_PIN_COOKIE)
+        self.assertNotContains(
+            client.get(f"/posts/{self.post.id}/"), "Свежий"
+        )
+
+
+@override_settings(JOBS_ALWAYS_EAGER=False)
+class JobQueueTest(TestCase):
+    def setUp(self):
+        self.Job = apps.get_model("core", "Job")
+        done_jobs.clear()
+
+    def run_workers(self):
+        call_command("run_workers", "--burst", stdout=StringIO())
+
+    def make_ready(self):
+        self.Job.objects.update(run_at=timezone.now())
+
+    def test_delay_and_run(self):
+        """delay ставит задание в очередь, run_workers выполняет"""
+        remember.delay("первое")
+        self.assertEqual(done_jobs, [])
+        self.assertEqual(jobs.stats()["ready"], 1)
+        self.run_workers()
+        self.assertEqual(done_jobs, ["первое"])
+        self.assertFalse(self.Job.objects.exists())
+
+    def test_retry_with_backoff(self):
+        """Упавшее задание откладывается, после max_attempts — dead"""
+        remember.delay("сбой")
+        with self.assertLogs("core.jobs", "WARNING"):
+            self.run_workers()
+        job = self.Job.objects.get()
+        self.assertEqual(job.attempts, 1)
+        self.assertFalse(job.failed)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn("ValueError", job.last_error)
+        self.assertEqual(jobs.stats()["scheduled"], 1)
+        self.make_ready()
+        with self.assertLogs("core.jobs", "WARNING"):
+            self.run_workers()
+        self.assertTrue(self.Job.objects.get().failed)
+        self.assertEqual(jobs.stats()["dead"], 1)
+
+    def test_lost_worker_job_redelivered(self):
+        """Задание упавшего воркера выполняется после истечения аренды"""
+        remember.delay("второе")
+        self.assertIsNotNone(jobs.claim("упавший воркер"))
+        self.assertEqual(jobs.stats()["running"], 1)
+        self.run_workers()
+        self.assertEqual(done_jobs, [])
+        self.make_ready()
+        self.run_workers()
+        self.assertEqual(done_jobs, ["второе"])
+
+    def test_lost_last_attempt_fails(self):
+        """Задание, уронившее воркер на последней попытке, не выдаётся"""
+        remember.delay("тяжёлое")
+        for _ in range(2):
+            self.assertIsNotNone(jobs.claim("упавший воркер"))
+            self.make_ready()
+        with self.assertLogs("core.jobs", "WARNING"):
+            self.assertIsNone(jobs.claim("воркер"))
+        job = self.Job.objects.get()
+        self.assertTrue(job.failed)
+        self.assertEqual(job.attempts, 2)
+        self.assertIn("упавший воркер", job.last_error)
+
+    @override_settings(JOBS_ALWAYS_EAGER=True)
+    def test_eager(self):
+        remember.delay("сразу")
+        self.assertEqual(done_jobs, ["сразу"])
+        self.assertFalse(self.Job.objects.exists())
+
+    def test_queue_depth_in_metrics(self):
+        remember.delay("третье")
+        directory = tempfile.TemporaryDirectory()
+        with directory, override_settings(METRICS_DIR=directory.name):
+            text = self.client.get("/metrics").content.decode()
+        self.assertIn('yatube_job_queue_depth{state="ready"} 1', text)
+
+
+class FileServingTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        media = os.path.join(self.root.name, "media")
+        self.hashed = f"posts/ab/cd/abcd{'0' * 60}.jpg"
+        for name in (self.hashed, "posts/old.jpg"):
+            os.makedirs(os.path.dirname(os.path.join(media, name)),
+                        exist_ok=True)
+            with open(os.path.join(media, name), "wb") as file:
+                file.write(b"0123456789")
+        static = os.path.join(self.root.name, "static")
+        os.makedirs(static)
+        self.css = b"body { color: black; }\n" * 100
+        with open(os.path.join(static, "app.css"), "wb") as file:
+            file.write(self.css)
+        self.settings = override_settings(
+            MEDIA_ROOT=media,
+            STATIC_ROOT=os.path.join(self.root.name, "collected"),
+            STATICFILES_DIRS=[static],
+            STATICFILES_STORAGE=(
+                "core.storage.CompressedManifestStaticFilesStorage"
+            ),
+        )
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def get(self, path, **headers):
+        response = self.client.get(path, **headers)
+        response.body = (
+            b"".join(response.streaming_content) if response.streaming
+            else response.content
+        )
+        return response
+
+    def test_media_ranges_and_caching(self):
+        """Картинки по хешу кешируются навсегда, Range отдаёт часть файла"""
+        url = f"/media/{self.hashed}"
+        response = self.get(url)
+        self.assertEqual(response.body, b"0123456789")
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn("immutable", response["Cache-Control"])
+        partial = self.get(url, HTTP_RANGE="bytes=2-5")
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial.body, b"2345")
+        self.assertEqual(partial["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(self.get(url, HTTP_RANGE="bytes=-3").body, b"789")
+        self.assertEqual(self.get(url, HTTP_RANGE="bytes=20-").status_code,
+                         416)
+        self.assertEqual(
+            self.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code,
+            304,
+        )
+        self.assertNotIn(
+            "immutable", self.get("/media/posts/old.jpg")["Cache-Control"]
+        )
+        self.assertEqual(self.get("/media/../static/app.css").status_code,
+                         400)
+        self.assertEqual(self.get("/media/posts/none.jpg").status_code, 404)
+
+    def test_collected_static_compressed(self):
+        """collectstatic готовит имена с хешем и сжатые копии"""
+        call_command("collectstatic", "--noinput", verbosity=0)
+        with open(os.path.join(settings.STATIC_ROOT, "staticfiles.json")) as f:
+            name = json.load(f)["paths"]["app.css"]
+        self.assertTrue(os.path.exists(
+            os.path.join(settings.STATIC_ROOT, name + ".gz")
+        ))
+        response = self.get(
+            f"/static/{name}", HTTP_ACCEPT_ENCODING="gzip, deflate"
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], "text/css")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(gzip.decompress(response.body), self.css)
+        plain = self.get(f"/static/{name}")
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        self.assertEqual(plain.body, self.css)
+        for refused in ("gzip; q=0", "gzip;q=0.0", "br;q=0.000, gzip;Q=0"):
+            with self.subTest(accept=refused):
+                response = self.get(
+                    f"/static/{name}", HTTP_ACCEPT_ENCODING=refused
+                )
+                self.assertFalse(response.has_header("Content-Encoding"))
@@ -1,5 +1,19 @@
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import views as staticfiles_views
+from django.core.cache import cache
+from django.http import HttpResponse
 from django.shortcuts import render
 
+from . import jobs
+from . import metrics as collector
+from .serve import serve
+from .storage import is_hashed
+
+# имя после ManifestStaticFilesStorage: app.<12 символов хеша>.css
+VERSIONED_STATIC_RE = re.compile(r"\.[0-9a-f]{12}\.\w+$")
+
 
 def page_not_found(request, *args, **argv):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -15,3 +29,34 @@ def page_500(request, *args, **argv):
 
 def page_403(request, *args, **argv):
     return render(request, 'core/403.html', {'path': request.path}, status=403)
+
+
+def metrics(request):
+    values, histograms = collector.collect()
+    if hasattr(cache, "get_stats"):
+        for name, value in cache.get_stats().items():
+            if name in ("hits", "misses", "evictions"):
+                key = "yatube_cache_operations", (("operation", name),)
+                values[key] = value
+    queue = jobs.stats()
+    values["yatube_job_queue_age_seconds", ()] = queue.pop("oldest_seconds")
+    for state, depth in queue.items():
+        values["yatube_job_queue_depth", (("state", state),)] = depth
+    return HttpResponse(
+        collector.render(values, histograms),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+def static_file(request, path):
+    if settings.DEBUG:
+        # без collectstatic: файл ищется в каталогах приложений
+        return staticfiles_views.serve(request, path)
+    return serve(
+        request, path, settings.STATIC_ROOT,
+        immutable=VERSIONED_STATIC_RE.search, compressed=True,
+    )
+
+
+def media_file(request, path):
+    return serve(request, path, settings.MEDIA_ROOT, immutable=is_hashed)
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from . import search
 from .models import Post
 from .models import Group
 
@@ -9,6 +10,14 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ("pub_date",)
     empty_value_display = "-пусто-"
     list_editable = ("group",)
+    search_limit = 1000
+
+    def get_search_results(self, request, queryset, search_term):
+        # вместо LIKE '%...%' по всей таблице — полнотекстовый индекс
+        if not search_term.strip():
+            return queryset, False
+        ids = search.ranked_ids(search_term, self.search_limit)
+        return queryset.filter(pk__in=ids), False
 
 
 admin.site.register(Post, PostAdmin)
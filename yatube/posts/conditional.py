@@ -0,0 +1,113 @@
+"""Условные GET для лент и страницы поста.
+
+Валидаторы считаются без рендеринга. Для лент это поколения областей
+``feed_cache`` (меняются при любой правке постов, групп и
+пользователей) и время их последнего изменения — без запросов к БД,
+кроме поиска группы или автора по адресу. Для страницы поста — один
+запрос: счётчики поста и автора и время последнего комментария.
+Готовность превью в валидаторы не входит: до следующей правки клиент
+может видеть оригинал картинки вместо превью.
+
+Страницы зависят от пользователя (шапка, форма комментария, кнопка
+подписки), поэтому его id входит в ETag, а ответы помечаются
+``Vary: Cookie``.
+"""
+import hashlib
+
+from django.contrib.auth import get_user_model
+from django.db.models import DateTimeField, Exists, Max, OuterRef, Subquery
+from django.views.decorators.http import condition
+
+from . import feed_cache
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# увеличить при изменении шаблонов страниц
+VERSION = 2
+
+
+class Validators:
+    def __init__(self, request, parts, last_modified):
+        user = request.user.pk if request.user.is_authenticated else ""
+        key = ":".join(str(part) for part in (VERSION, user, *parts))
+        self.etag = hashlib.md5(key.encode()).hexdigest()
+        self.last_modified = last_modified
+
+
+def conditional_page(validators):
+    """``condition``, который считает валидаторы один раз за запрос.
+
+    ``validators(request, *args, **kwargs)`` возвращает ``Validators``
+    или ``None``, если страницы нет: тогда view отработает как обычно.
+    """
+    def compute(request, *args, **kwargs):
+        if not hasattr(request, "_validators"):
+            request._validators = validators(request, *args, **kwargs)
+        return request._validators
+
+    def etag(request, *args, **kwargs):
+        return getattr(compute(request, *args, **kwargs), "etag", None)
+
+    def last_modified(request, *args, **kwargs):
+        result = compute(request, *args, **kwargs)
+        return getattr(result, "last_modified", None)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def _feed(request, scopes, *parts):
+    scopes = ("meta",) + tuple(scopes)
+    generations = [feed_cache.generation(scope) for scope in scopes]
+    return Validators(
+        request, [*generations, *parts], feed_cache.last_changed(scopes)
+    )
+
+
+def index(request):
+    return _feed(request, ["all"])
+
+
+def group_posts(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        "id", flat=True
+    ).first()
+    if group_id is None:
+        return None
+    return _feed(request, [f"group:{group_id}"])
+
+
+def profile(request, username):
+    following = Follow.objects.filter(
+        user_id=request.user.pk, author=OuterRef("pk")
+    )
+    row = User.objects.filter(username=username).annotate(
+        is_followed=Exists(following)
+    ).values_list("id", "is_followed").first()
+    if row is None:
+        return None
+    author_id, following = row
+    return _feed(request, [f"author:{author_id}"], following)
+
+
+def post_detail(request, post_id):
+    # подзапрос идёт по индексу (post, created), без GROUP BY по посту
+    last_comment = Comment.objects.filter(
+        post=OuterRef("pk")
+    ).order_by().values("post").annotate(last=Max("created")).values("last")
+    row = Post.objects.filter(id=post_id).order_by().annotate(
+        last_comment=Subquery(last_comment, output_field=DateTimeField()),
+    ).values_list(
+        "updated", "author__stats__posts_count", "comments_count",
+        "last_comment",
+    ).first()
+    if row is None:
+        return None
+    updated, posts_count, comments_count, last_comment = row
+    meta = feed_cache.generation("meta")
+    changed = [updated, last_comment, feed_cache.last_changed(["meta"])]
+    return Validators(
+        request,
+        [meta, updated.timestamp(), posts_count, comments_count],
+        max(value for value in changed if value is not None),
+    )
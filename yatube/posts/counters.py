@@ -0,0 +1,124 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарно через ``F()`` из сигналов моделей, а
+команда ``recount_stats`` пересчитывает их целиком, если они разошлись
+с данными.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+USER_COUNTERS = (
+    "posts_count", "comments_count", "followers_count", "following_count"
+)
+
+
+def _add(name, delta):
+    # разошедшийся счётчик не уходит ниже нуля: PositiveIntegerField
+    # откатил бы всю транзакцию с IntegrityError
+    return Greatest(F(name) + delta, 0)
+
+
+def bump_user(user_id, **deltas):
+    updates = {name: _add(name, delta) for name, delta in deltas.items()}
+    updated = UserStats.objects.filter(user_id=user_id).update(**updates)
+    if not updated and all(delta > 0 for delta in deltas.values()):
+        # строки ещё нет: пересчитываем её целиком, а не с нуля
+        recount_users(User.objects.filter(pk=user_id))
+
+
+def bump_group(group_id, delta):
+    if group_id is not None:
+        Group.objects.filter(pk=group_id).update(
+            posts_count=_add("posts_count", delta)
+        )
+
+
+def bump_post(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=_add("comments_count", delta)
+    )
+
+
+def posts_count(user):
+    """Число постов из счётчика или ``None``, если счётчика ещё нет."""
+    try:
+        return user.stats.posts_count
+    except UserStats.DoesNotExist:
+        return None
+
+
+def _counts(manager, field, ids):
+    # без order_by() Django 2.2 добавит Meta.ordering в GROUP BY
+    queryset = manager.filter(**{f"{field}__in": ids}).order_by()
+    return dict(
+        queryset.values(field)
+        .annotate(total=Count("id"))
+        .values_list(field, "total")
+    )
+
+
+def recount_users(users=None):
+    """Пересчитать ``UserStats``; возвращает число исправленных строк."""
+    users = User.objects.all() if users is None else users
+    user_ids = users.values_list("id", flat=True)
+    actual = {
+        "posts_count": _counts(Post.objects, "author", user_ids),
+        "comments_count": _counts(Comment.objects, "author", user_ids),
+        "followers_count": _counts(Follow.objects, "author", user_ids),
+        "following_count": _counts(Follow.objects, "user", user_ids),
+    }
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=user_id) for user_id in user_ids.iterator()),
+        ignore_conflicts=True,
+    )
+    stale = []
+    stats = UserStats.objects.filter(user_id__in=user_ids)
+    for row in stats.iterator(chunk_size=BATCH_SIZE):
+        changed = False
+        for name in USER_COUNTERS:
+            value = actual[name].get(row.user_id, 0)
+            if getattr(row, name) != value:
+                setattr(row, name, value)
+                changed = True
+        if changed:
+            stale.append(row)
+    UserStats.objects.bulk_update(stale, USER_COUNTERS, batch_size=BATCH_SIZE)
+    return len(stale)
+
+
+def recount_groups():
+    """Пересчитать ``Group.posts_count``; возвращает число исправлений."""
+    actual = _counts(Post.objects, "group", Group.objects.values("id"))
+    stale = []
+    for group in Group.objects.only("id", "posts_count").iterator():
+        value = actual.get(group.id, 0)
+        if group.posts_count != value:
+            group.posts_count = value
+            stale.append(group)
+    Group.objects.bulk_update(stale, ["posts_count"], batch_size=BATCH_SIZE)
+    return len(stale)
+
+
+def recount_posts():
+    """Пересчитать ``Post.comments_count`` одним ``UPDATE``.
+
+    Постов бывает на порядки больше, чем групп, поэтому они не читаются
+    в память: подзапрос идёт по индексу комментариев ``(post, created)``.
+    """
+    actual = Coalesce(
+        Subquery(
+            Comment.objects.filter(post=OuterRef("pk")).order_by()
+            .values("post").annotate(total=Count("id")).values("total"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+    return Post.objects.exclude(comments_count=actual).update(
+        comments_count=actual
+    )
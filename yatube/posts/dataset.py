@@ -0,0 +1,324 @@
+"""Синтетические данные для нагрузочных прогонов и планирования ёмкости.
+
+Строки генерируются пачками по ``BATCH_SIZE`` в отдельных процессах, а
+вставляет их только основной процесс: SQLite всё равно пишет в один
+поток. Генератор каждой пачки засевается от
+``(seed, таблица, номер пачки)``, поэтому данные одинаковы при любом
+числе процессов.
+
+Пользователи и группы создаются через ``bulk_create``, а посты,
+комментарии и подписки — прямым ``executemany``: на миллионах строк
+сборка моделей и SQL в ORM занимает больше времени, чем сама вставка.
+
+Распределения похожи на настоящие: авторство и подписки подчиняются
+закону Ципфа, число подписок у пользователя — распределению Парето,
+посты идут сериями с короткими паузами. У первых пользователей больше
+всего подписчиков; самые активные авторы — другие пользователи,
+выбранные перестановкой от ``seed``: если бы они совпадали с самыми
+популярными, ленты подписок разрастались бы как произведение двух
+хвостов. Сигналы при такой вставке не
+срабатывают, поэтому после неё нужен ``refresh()``.
+"""
+import io
+import itertools
+import random
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from faker import Faker
+
+from core.parallel import imap
+
+from . import counters, search, timeline
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+BATCH_SIZE = 5000
+USERNAME_PREFIX = "bench"
+PASSWORD = "benchmark"
+# средняя длина серии постов и пауза между постами серии, секунды
+BURST_LENGTH = 4
+BURST_GAP = 600
+# через сколько в среднем после поста приходит комментарий, секунды
+COMMENT_DELAY = 6 * 3600
+# показатель Парето для числа подписок: среднее конечно при > 1
+FOLLOWS_SHAPE = 2.0
+IMAGE_VARIANTS = 16
+IMAGE_SIZE = (960, 640)
+
+_faker = None
+
+
+def skewed_weights(count, exponent=1.1):
+    """Веса по закону Ципфа: i-й элемент в i**exponent раз реже первого."""
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+@lru_cache(maxsize=4)
+def _cum_weights(count):
+    return list(itertools.accumulate(skewed_weights(count)))
+
+
+def _zipf(rng, count, k=1):
+    """``k`` номеров от 0 до ``count - 1``, первые — чаще."""
+    return rng.choices(range(count), cum_weights=_cum_weights(count), k=k)
+
+
+@lru_cache(maxsize=4)
+def _activity(seed, count):
+    """Номера пользователей по убыванию активности."""
+    order = list(range(count))
+    random.Random(f"{seed}:activity").shuffle(order)
+    return order
+
+
+def _random(seed, table, chunk):
+    rng = random.Random(f"{seed}:{table}:{chunk}")
+    global _faker
+    if _faker is None:
+        _faker = Faker("ru_RU")
+    _faker.seed_instance(rng.random())
+    return rng, _faker
+
+
+def _chunks(total, size=BATCH_SIZE):
+    """``(номер, первый, сколько)`` для пачек из ``total`` строк."""
+    return [
+        (number, first, min(size, total - first))
+        for number, first in enumerate(range(0, total, size))
+    ]
+
+
+def image_name(variant):
+    return f"posts/seed-{variant}.jpg"
+
+
+def _user_rows(task):
+    seed, (chunk, first, count) = task
+    rng, fake = _random(seed, "users", chunk)
+    return [(fake.first_name(), fake.last_name()) for _ in range(count)]
+
+
+def _post_rows(task):
+    """Посты сериями: автор пишет несколько постов подряд в одну группу."""
+    seed, (chunk, first, count), users, groups, start, span, images = task
+    rng, fake = _random(seed, "posts", chunk)
+    activity = _activity(seed, users)
+    rows = []
+    while len(rows) < count:
+        author = activity[_zipf(rng, users)[0]]
+        group = rng.randrange(groups + 1) if groups else None
+        moment = start + rng.random() * span
+        length = 1 + int(rng.expovariate(1 / (BURST_LENGTH - 1)))
+        for _ in range(min(length, count - len(rows))):
+            image = (
+                image_name(rng.randrange(IMAGE_VARIANTS))
+                if rng.random() < images else ""
+            )
+            text = fake.paragraph(nb_sentences=rng.randint(1, 8))
+            rows.append((author, group, text,
+                         _db_datetime(min(moment, start + span)), image))
+            moment += rng.expovariate(1 / BURST_GAP)
+    return rows
+
+
+def _comment_rows(task):
+    seed, (chunk, first, count), users, posts = task
+    rng, fake = _random(seed, "comments", chunk)
+    return [
+        (rng.randrange(posts), rng.randrange(users), fake.sentence(),
+         rng.expovariate(1 / COMMENT_DELAY))
+        for _ in range(count)
+    ]
+
+
+def _follow_rows(task):
+    seed, (chunk, first, count), users, follows_per_user = task
+    rng, _ = _random(seed, "follows", chunk)
+    scale = follows_per_user * (FOLLOWS_SHAPE - 1) / FOLLOWS_SHAPE
+    rows = []
+    for user in range(first, first + count):
+        k = min(users - 1, int(rng.paretovariate(FOLLOWS_SHAPE) * scale))
+        authors = set(_zipf(rng, users, k))
+        authors.discard(user)
+        rows.extend((user, author) for author in sorted(authors))
+    return rows
+
+
+def _db_datetime(value):
+    if not isinstance(value, datetime):
+        value = datetime.fromtimestamp(value, timezone.utc)
+    return connection.ops.adapt_datetimefield_value(value)
+
+
+def _insert(model, fields, rows, ignore=False):
+    """Вставить готовые значения столбцов в обход ORM."""
+    if not rows:
+        return
+    columns = ", ".join(
+        connection.ops.quote_name(model._meta.get_field(name).column)
+        for name in fields
+    )
+    values = ", ".join(["%s"] * len(fields))
+    verb = "INSERT OR IGNORE" if ignore else "INSERT"
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            f"{verb} INTO {model._meta.db_table} ({columns})"
+            f" VALUES ({values})",
+            rows,
+        )
+
+
+def create_images():
+    """Положить в хранилище картинки, на которые ссылаются посты."""
+    from PIL import Image
+
+    for variant in range(IMAGE_VARIANTS):
+        name = image_name(variant)
+        if default_storage.exists(name):
+            continue
+        rng = random.Random(variant)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        buffer = io.BytesIO()
+        Image.new("RGB", IMAGE_SIZE, color).save(buffer, "JPEG")
+        default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def _new_ids(model, before):
+    bounds = model.objects.filter(id__gt=before).aggregate(
+        first=Min("id"), last=Max("id")
+    )
+    return bounds["first"], bounds["last"]
+
+
+def generate(users=1000, groups=20, posts=10000, comments=10000,
+             follows_per_user=20, seed=0, images=0.0, days=365, until=None,
+             workers=1):
+    """Наполнить БД; при одинаковом ``seed`` и ``until`` данные одинаковые.
+
+    ``images`` — доля постов с картинкой; посты разбросаны по ``days``
+    дням до ``until`` (по умолчанию до текущего момента). Возвращает id
+    пользователей.
+    """
+    if images:
+        create_images()
+    end = until or timezone.now()
+    start = end - timedelta(days=days)
+    user_ids = _generate_users(users, seed, start, workers)
+    group_ids = _generate_groups(groups, seed)
+    first_post = _generate_posts(
+        posts, seed, user_ids, group_ids, start, end, images, workers
+    )
+    _generate_comments(
+        comments, seed, user_ids, first_post, posts, end, workers
+    )
+    _generate_follows(follows_per_user, seed, user_ids, workers)
+    return user_ids
+
+
+def _generate_users(users, seed, start, workers):
+    password = make_password(PASSWORD)
+    offset = User.objects.count()
+    tasks = [(seed, chunk) for chunk in _chunks(users)]
+    for (_, (_, first, _)), names in zip(
+        tasks, imap(_user_rows, tasks, workers)
+    ):
+        User.objects.bulk_create(
+            User(username=f"{USERNAME_PREFIX}{offset + first + i}",
+                 password=password, first_name=first_name,
+                 last_name=last_name, date_joined=start)
+            for i, (first_name, last_name) in enumerate(names)
+        )
+    return list(
+        User.objects.filter(username__startswith=USERNAME_PREFIX)
+        .order_by("id").values_list("id", flat=True)
+    )
+
+
+def _generate_groups(groups, seed):
+    rng, fake = _random(seed, "groups", 0)
+    offset = Group.objects.count()
+    Group.objects.bulk_create(
+        Group(title=fake.catch_phrase()[:200], slug=f"bench-{offset + i}",
+              description=fake.paragraph())
+        for i in range(groups)
+    )
+    return list(Group.objects.order_by("id").values_list("id", flat=True))
+
+
+def _generate_posts(posts, seed, user_ids, group_ids, start, end, images,
+                    workers):
+    """Вставить посты; вернуть id первого из них."""
+    before = Post.objects.aggregate(last=Max("id"))["last"] or 0
+    span = (end - start).total_seconds()
+    tasks = [
+        (seed, chunk, len(user_ids), len(group_ids), start.timestamp(),
+         span, images)
+        for chunk in _chunks(posts)
+    ]
+    group_ids = group_ids + [None]
+    fields = (
+        "author", "group", "text", "pub_date", "updated", "image",
+        "comments_count",
+    )
+    for rows in imap(_post_rows, tasks, workers):
+        _insert(Post, fields, [
+            (user_ids[author], group_ids[-1 if group is None else group],
+             text, pub_date, pub_date, image, 0)
+            for author, group, text, pub_date, image in rows
+        ])
+    return _new_ids(Post, before)[0]
+
+
+def _generate_comments(comments, seed, user_ids, first_post, posts, end,
+                       workers):
+    if first_post is None:
+        return
+    tasks = [
+        (seed, chunk, len(user_ids), posts) for chunk in _chunks(comments)
+    ]
+    fields = ("post", "author", "text", "created")
+    for rows in imap(_comment_rows, tasks, workers):
+        dates = dict(
+            Post.objects.filter(
+                id__in={first_post + post for post, *_ in rows}
+            ).values_list("id", "pub_date")
+        )
+        _insert(Comment, fields, [
+            (first_post + post, user_ids[author], text, _db_datetime(min(
+                dates[first_post + post] + timedelta(seconds=delay), end
+            )))
+            for post, author, text, delay in rows
+            if first_post + post in dates
+        ])
+
+
+def _generate_follows(follows_per_user, seed, user_ids, workers):
+    if len(user_ids) < 2 or not follows_per_user:
+        return
+    size = max(1, BATCH_SIZE // follows_per_user)
+    tasks = [
+        (seed, chunk, len(user_ids), follows_per_user)
+        for chunk in _chunks(len(user_ids), size)
+    ]
+    for rows in imap(_follow_rows, tasks, workers):
+        _insert(Follow, ("user", "author"), [
+            (user_ids[user], user_ids[author]) for user, author in rows
+        ], ignore=True)
+
+
+def refresh(workers=1):
+    """Пересчитать всё, что обычно поддерживают сигналы."""
+    counters.recount_users()
+    counters.recount_groups()
+    counters.recount_posts()
+    timeline.rebuild()
+    search.rebuild(workers)
@@ -0,0 +1,139 @@
+"""Кеш страниц лент с инвалидацией по поколениям.
+
+Ключ страницы содержит номера поколений её областей (``all``,
+``group:<id>``, ``author:<id>``, ``meta``). Сигналы моделей увеличивают
+поколение, и все страницы области разом становятся устаревшими, поэтому
+TTL можно держать большим. Устаревшую страницу пересобирает один
+воркер (блокировка через ``cache.add``). Пока он работает, остальные
+отдают прежнюю версию, только если у неё истёк лишь срок свежести;
+страницу прошлого поколения они не отдают, а ждут новую не дольше
+``WAIT_TIMEOUT`` и затем собирают сами.
+
+Вместе с поколением хранится время последнего изменения области: по
+нему ``conditional`` отдаёт ``Last-Modified``.
+"""
+import hashlib
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from core import metrics
+
+LOCK_TIMEOUT = 10
+# дольше ждать чужую пересборку нельзя: читатели ленты висели бы на ней
+WAIT_TIMEOUT = 0.5
+LOCK_POLL = 0.05
+
+
+def _generation_key(scope):
+    return f"feed:gen:{scope}"
+
+
+def _changed_key(scope):
+    return f"feed:changed:{scope}"
+
+
+def _initial_generation():
+    # после потери ключа поколение не должно совпасть с прежним
+    return time.time_ns() // 1000
+
+
+def generation(scope):
+    key = _generation_key(scope)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, _initial_generation(), None)
+        cache.add(_changed_key(scope), time.time(), None)
+        value = cache.get(key)
+    return value
+
+
+def last_changed(scopes):
+    """Когда менялась любая из областей; ``None``, если неизвестно."""
+    keys = [_changed_key(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    if len(values) < len(keys):
+        return None
+    return datetime.fromtimestamp(max(values.values()), timezone.utc)
+
+
+def bump(*scopes):
+    for scope in scopes:
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_generation(), None)
+    cache.set_many(
+        {_changed_key(scope): time.time() for scope in scopes}, None
+    )
+
+
+def bump_post(author_id, *group_ids):
+    scopes = ["all", f"author:{author_id}"]
+    scopes += [f"group:{pk}" for pk in set(group_ids) if pk is not None]
+    bump(*scopes)
+
+
+def _freeze(page):
+    """Оставить в странице только то, что нужно шаблону."""
+    paginator = page.paginator
+    paginator.num_pages  # cached_property: считаем до сброса object_list
+    page.object_list = list(page.object_list)
+    paginator.object_list = []
+    return page
+
+
+def _page_key(scopes, request):
+    params = "&".join(
+        f"{name}={request.GET.get(name, '')}" for name in ("page", "cursor")
+    )
+    digest = hashlib.md5(f"{'|'.join(scopes)}?{params}".encode()).hexdigest()
+    return f"feed:page:{digest}"
+
+
+def cached_page(request, scopes, build):
+    """Страница ленты из кеша или от ``build()``.
+
+    ``scopes`` — области, изменения в которых делают страницу устаревшей.
+    """
+    scopes = ("meta",) + tuple(scopes)
+    key = _page_key(scopes, request)
+    generations = [generation(scope) for scope in scopes]
+    entry = cache.get(key)
+    now = time.time()
+    current = entry is not None and entry[0] == generations
+    if current and entry[1] > now:
+        metrics.inc("yatube_feed_cache_total", result="hit")
+        return entry[2]
+    lock = f"{key}:lock"
+    locked = cache.add(lock, 1, LOCK_TIMEOUT)
+    if not locked:
+        if current:
+            metrics.inc("yatube_feed_cache_total", result="stale")
+            return entry[2]
+        # в кеше прошлое поколение: удалённое и изменённое не
+        # показываем, недолго ждём страницу владельца блокировки, а
+        # потом собираем её сами
+        deadline = now + WAIT_TIMEOUT
+        while time.time() < deadline:
+            time.sleep(LOCK_POLL)
+            entry = cache.get(key)
+            if entry is not None and entry[0] == generations:
+                metrics.inc("yatube_feed_cache_total", result="wait")
+                return entry[2]
+    metrics.inc("yatube_feed_cache_total", result="miss")
+    try:
+        page = _freeze(build())
+        cache.set(
+            key,
+            (generations, now + settings.FEED_CACHE_FRESH, page),
+            settings.FEED_CACHE_TIMEOUT,
+        )
+    finally:
+        if locked:
+            cache.delete(lock)
+    return page
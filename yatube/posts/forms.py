@@ -1,4 +1,5 @@
 from django import forms
+from . import uploads
 from .models import Post
 from .models import Group
 from .models import Comment
@@ -17,6 +18,9 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ("text", "group", "image")
 
+    def clean_image(self):
+        return uploads.clean_image(self.cleaned_data["image"])
+
 
 class CommentForm(forms.ModelForm):
     text = forms.CharField(widget=forms.Textarea,
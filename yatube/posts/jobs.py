@@ -0,0 +1,84 @@
+"""Фоновые задания постов: ленты, поисковый индекс, файлы картинок.
+
+Задание может выполниться повторно и не в том порядке, в каком его
+поставили, поэтому каждое перечитывает текущее состояние из БД и
+передаёт только id.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.jobs import job
+from core.storage import is_hashed
+
+from . import search, thumbnails, timeline
+from .models import Follow, Post
+
+
+def _following(user_id, author_id):
+    return Follow.objects.filter(user_id=user_id, author_id=author_id).exists()
+
+
+@job
+def push_post(post_id):
+    post = Post.objects.filter(pk=post_id).only(
+        "id", "author_id", "pub_date"
+    ).first()
+    if post is not None:
+        timeline.push_post(post)
+
+
+@job
+def backfill(user_id, author_id):
+    if _following(user_id, author_id):
+        timeline.backfill(user_id, author_id)
+
+
+@job
+def trim(user_id, author_id):
+    if not _following(user_id, author_id):
+        timeline.trim(user_id, author_id)
+
+
+@job
+def author_demoted(author_id):
+    timeline.author_demoted(author_id)
+
+
+@job
+def index_post(post_id):
+    """Переиндексировать пост, а удалённый — убрать из индекса."""
+    text = Post.objects.filter(pk=post_id).values_list(
+        "text", flat=True
+    ).first()
+    if text is None:
+        search.remove_posts([post_id])
+    else:
+        search.index_posts([(post_id, text)])
+
+
+@job
+def release_image(name):
+    """Удалить картинку и её превью, если на неё не ссылается ни один пост.
+
+    Одинаковые картинки хранятся одним файлом, поэтому ссылки считаются
+    запросом по индексу ``post_image_idx`` в момент выполнения задания.
+    Файлы со старыми именами не трогаются, пока их не перенесёт
+    ``manage.py migrate_media``.
+
+    Файл, который загружали заново не позже ``POST_IMAGE_RELEASE_GRACE``
+    секунд назад, не удаляется: пост с ним ещё может быть не сохранён.
+    """
+    if not is_hashed(name) or Post.objects.filter(image=name).exists():
+        return
+    storage = Post._meta.get_field("image").storage
+    try:
+        age = timezone.now() - storage.get_modified_time(name)
+    except FileNotFoundError:
+        age = None
+    grace = timedelta(seconds=settings.POST_IMAGE_RELEASE_GRACE)
+    if age is not None and age < grace:
+        return
+    thumbnails.forget(name)
+    storage.delete(name)
@@ -0,0 +1,75 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from posts import transfer
+
+
+def _export(arguments):
+    directory, table, options = arguments
+    try:
+        return table, transfer.export_table(directory, table, **options)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Выгружает группы, посты, комментарии и подписки в NDJSON/CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory")
+        parser.add_argument(
+            "--tables", default=",".join(transfer.TABLES),
+            help="таблицы через запятую"
+        )
+        parser.add_argument(
+            "--format", choices=transfer.FORMATS, default="ndjson"
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument(
+            "--media", choices=transfer.MEDIA_MODES, default="skip",
+            help="что делать с картинками постов"
+        )
+        parser.add_argument(
+            "--workers", type=int, default=1,
+            help="сколько таблиц выгружать параллельно"
+        )
+        parser.add_argument(
+            "--resume", action="store_true",
+            help="продолжить прерванную выгрузку"
+        )
+
+    def handle(self, *args, **options):
+        tables = options["tables"].split(",")
+        unknown = set(tables) - set(transfer.TABLES)
+        if unknown:
+            raise CommandError(
+                f"Неизвестные таблицы: {', '.join(sorted(unknown))}; "
+                f"доступны: {', '.join(transfer.TABLES)}"
+            )
+        os.makedirs(options["directory"], exist_ok=True)
+        table_options = {
+            "file_format": options["format"],
+            "chunk_size": options["chunk_size"],
+            "media": options["media"],
+            "resume": options["resume"],
+        }
+        jobs = [
+            (options["directory"], table, table_options)
+            for table in tables
+        ]
+        if options["workers"] > 1:
+            connections.close_all()
+            with ProcessPoolExecutor(options["workers"]) as pool:
+                results = list(pool.map(_export, jobs))
+        else:
+            results = [
+                (table, transfer.export_table(directory, table, **kwargs))
+                for directory, table, kwargs in jobs
+            ]
+        for table, rows in results:
+            self.stdout.write(self.style.SUCCESS(
+                f"{table}: выгружено строк {rows}"
+            ))
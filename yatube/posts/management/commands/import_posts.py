@@ -0,0 +1,83 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from posts import dataset, transfer
+
+
+def _import(arguments):
+    directory, table, options = arguments
+    try:
+        return table, transfer.import_table(directory, table, **options)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Загружает группы, посты, комментарии и подписки из NDJSON/CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory")
+        parser.add_argument(
+            "--tables", default=",".join(transfer.TABLES),
+            help="таблицы через запятую"
+        )
+        parser.add_argument(
+            "--format", choices=transfer.FORMATS, default="ndjson"
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--media", choices=transfer.MEDIA_MODES, default="copy",
+            help="что делать с картинками постов"
+        )
+        parser.add_argument(
+            "--workers", type=int, default=1,
+            help="сколько независимых таблиц грузить параллельно"
+        )
+        parser.add_argument(
+            "--resume", action="store_true",
+            help="продолжить с последней сохранённой пачки"
+        )
+        parser.add_argument(
+            "--no-refresh", action="store_true",
+            help="не пересчитывать счётчики, ленты и поисковый индекс"
+        )
+
+    def handle(self, *args, **options):
+        tables = options["tables"].split(",")
+        unknown = set(tables) - set(transfer.TABLES)
+        if unknown:
+            raise CommandError(
+                f"Неизвестные таблицы: {', '.join(sorted(unknown))}; "
+                f"доступны: {', '.join(transfer.TABLES)}"
+            )
+        table_options = {
+            "file_format": options["format"],
+            "batch_size": options["batch_size"],
+            "media": options["media"],
+            "resume": options["resume"],
+        }
+        for stage in transfer.stages(tables):
+            jobs = [
+                (options["directory"], table, table_options)
+                for table in stage
+            ]
+            for table, rows in self.run(jobs, options["workers"]):
+                self.stdout.write(self.style.SUCCESS(
+                    f"{table}: загружено строк {rows}"
+                ))
+        if not options["no_refresh"]:
+            # bulk_create не вызывает сигналы
+            dataset.refresh(options["workers"])
+
+    @staticmethod
+    def run(jobs, workers):
+        if workers > 1 and len(jobs) > 1:
+            connections.close_all()
+            with ProcessPoolExecutor(workers) as pool:
+                return list(pool.map(_import, jobs))
+        return [
+            (table, transfer.import_table(directory, table, **kwargs))
+            for directory, table, kwargs in jobs
+        ]
@@ -0,0 +1,81 @@
+import os
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import Case, CharField, Value, When
+
+from core.parallel import imap
+from core.storage import is_hashed
+from posts import feed_cache, thumbnails
+from posts.models import Post
+
+
+def _store(name):
+    """Записать файл под именем по хешу; ``None``, если файла нет."""
+    storage = Post._meta.get_field("image").storage
+    try:
+        with open(storage.path(name), "rb") as file:
+            return name, storage.save(name, File(file))
+    except FileNotFoundError:
+        return name, None
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит картинки постов, сохранённые до хранилища по хешу, "
+        "в каталоги по хешу содержимого"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count(),
+            help="число процессов (по умолчанию по числу ядер)"
+        )
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument(
+            "--keep", action="store_true",
+            help="не удалять старые файлы"
+        )
+
+    def handle(self, *args, **options):
+        # имена идут по индексу post_image_idx, каждое один раз
+        names = Post.objects.order_by("image").values_list(
+            "image", flat=True
+        ).distinct()
+        last = ""
+        moved = missing = 0
+        while True:
+            page = list(names.filter(image__gt=last)[:options["chunk_size"]])
+            if not page:
+                break
+            last = page[-1]
+            chunk = [name for name in page if not is_hashed(name)]
+            # дочерние процессы не должны унаследовать открытые соединения
+            connections.close_all()
+            renamed = {}
+            for old, new in imap(_store, chunk, options["workers"]):
+                if new is None:
+                    missing += 1
+                else:
+                    renamed[old] = new
+            if not renamed:
+                continue
+            with transaction.atomic():
+                Post.objects.filter(image__in=renamed).update(image=Case(
+                    *(When(image=old, then=Value(new))
+                      for old, new in renamed.items()),
+                    output_field=CharField(),
+                ))
+            for old in renamed:
+                # превью старых имён считались от хранилища по умолчанию
+                thumbnails.forget(old, default_storage)
+                if not options["keep"]:
+                    default_storage.delete(old)
+            moved += len(renamed)
+        if moved:
+            feed_cache.bump("meta")
+        self.stdout.write(self.style.SUCCESS(
+            f"Перенесено картинок: {moved}, без файла: {missing}"
+        ))
@@ -0,0 +1,22 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = "Пересобирает полнотекстовый индекс постов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count(),
+            help="число процессов (по умолчанию по числу ядер)"
+        )
+        parser.add_argument("--chunk-size", type=int, default=search.CHUNK)
+
+    def handle(self, *args, **options):
+        indexed = search.rebuild(options["workers"], options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Проиндексировано постов: {indexed}"
+        ))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобирает хранилище сведений о превью по файлам, "
+        "которые уже лежат в MEDIA_ROOT"
+    )
+
+    def handle(self, *args, **options):
+        store = default.kvstore
+        store.clear()
+        backend = thumbnails.DeferredThumbnailBackend()
+        # без order_by в DISTINCT попал бы pub_date из Meta.ordering
+        names = (
+            Post.objects.exclude(image="").exclude(image=None)
+            .order_by("image").values_list("image", flat=True).distinct()
+        )
+        found = missing = 0
+        for name in names.iterator():
+            source = thumbnails.source(name)
+            if not source.exists():
+                missing += 1
+                continue
+            store.get_or_set(source)
+            for geometry, preset in thumbnails.presets():
+                thumbnail = ImageFile(
+                    backend.thumbnail_name(source, geometry, **preset),
+                    default.storage,
+                )
+                if thumbnail.exists():
+                    store.set(thumbnail, source)
+                    found += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Найдено превью: {found}, картинок без файла: {missing}"
+        ))
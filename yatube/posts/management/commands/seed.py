@@ -0,0 +1,76 @@
+import os
+import time
+from datetime import date, datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts import dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Наполняет БД синтетическими пользователями, группами, постами, "
+        "комментариями и подписками"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--groups", type=int, default=20)
+        parser.add_argument("--posts", type=int, default=10000)
+        parser.add_argument("--comments", type=int, default=10000)
+        parser.add_argument(
+            "--follows-per-user", type=int, default=20,
+            help="среднее число подписок; распределение с тяжёлым хвостом"
+        )
+        parser.add_argument(
+            "--images", type=float, default=0.0,
+            help="доля постов с картинкой, от 0 до 1"
+        )
+        parser.add_argument(
+            "--days", type=int, default=365,
+            help="за сколько последних дней разбросать посты"
+        )
+        parser.add_argument(
+            "--until", type=date.fromisoformat,
+            help="дата последнего поста, ГГГГ-ММ-ДД (по умолчанию сейчас)"
+        )
+        parser.add_argument(
+            "--random-seed", type=int, default=0,
+            help="одинаковый seed даёт одинаковые данные"
+        )
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count(),
+            help="число процессов (по умолчанию по числу ядер)"
+        )
+        parser.add_argument(
+            "--no-refresh", action="store_true",
+            help="не пересчитывать счётчики, ленты и поисковый индекс"
+        )
+
+    def handle(self, *args, **options):
+        if not 0 <= options["images"] <= 1:
+            raise CommandError("--images должно быть от 0 до 1")
+        started = time.monotonic()
+        user_ids = dataset.generate(
+            users=options["users"],
+            groups=options["groups"],
+            posts=options["posts"],
+            comments=options["comments"],
+            follows_per_user=options["follows_per_user"],
+            seed=options["random_seed"],
+            images=options["images"],
+            days=options["days"],
+            until=options["until"] and datetime.combine(
+                options["until"], datetime.min.time(), timezone.utc
+            ),
+            workers=options["workers"],
+        )
+        generated = time.monotonic() - started
+        if not options["no_refresh"]:
+            # bulk_create не вызывает сигналы
+            dataset.refresh(options["workers"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово за {time.monotonic() - started:.1f} с"
+            f" (вставка {generated:.1f} с), пользователей {len(user_ids)}"
+        ))
@@ -0,0 +1,54 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.parallel import imap
+from posts import thumbnails
+from posts.models import Post
+
+
+def _warm(names):
+    failed = 0
+    for name in names:
+        try:
+            thumbnails.generate(name)
+        except Exception:
+            failed += 1
+    connections.close_all()
+    return len(names) - failed, failed
+
+
+class Command(BaseCommand):
+    help = "Заранее нарезает превью для картинок существующих постов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count(),
+            help="число процессов (по умолчанию по числу ядер)"
+        )
+        parser.add_argument("--chunk-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        # имена идут по индексу post_image_idx, каждое один раз
+        names = Post.objects.exclude(image="").exclude(image=None).order_by(
+            "image"
+        ).values_list("image", flat=True).distinct()
+        size = options["chunk_size"]
+        workers = options["workers"]
+        last = ""
+        done = failed = 0
+        while True:
+            page = list(names.filter(image__gt=last)[:size * workers])
+            if not page:
+                break
+            last = page[-1]
+            chunks = [page[i:i + size] for i in range(0, len(page), size)]
+            # дочерние процессы не должны унаследовать открытые соединения
+            connections.close_all()
+            for ok, errors in imap(_warm, chunks, workers):
+                done += ok
+                failed += errors
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово картинок: {done}, с ошибками: {failed}"
+        ))
@@ -0,0 +1,152 @@
+# Generated by Django 2.2.16 on 2026-10-18 09:12
+
+import re
+
+from django.db import migrations
+
+# Копия posts.stemmer на момент миграции: модуль может измениться или
+# исчезнуть, а миграция должна заполнять индекс так же, как раньше.
+
+VOWELS = "аеиоуыэюя"
+AFTER_A = "ая"
+
+PERFECTIVE_GERUND = (
+    ("в", "вши", "вшись"),
+    ("ив", "ивши", "ившись", "ыв", "ывши", "ывшись"),
+)
+ADJECTIVE = ((), (
+    "ее", "ие", "ые", "ое", "ими", "ыми", "ей", "ий", "ый", "ой", "ем",
+    "им", "ым", "ом", "его", "ого", "ему", "ому", "их", "ых", "ую", "юю",
+    "ая", "яя", "ою", "ею",
+))
+PARTICIPLE = (
+    ("ем", "нн", "вш", "ющ", "щ"),
+    ("ивш", "ывш", "ующ"),
+)
+REFLEXIVE = ((), ("ся", "сь"))
+VERB = (
+    ("ла", "на", "ете", "йте", "ли", "й", "л", "ем", "н", "ло", "но", "ет",
+     "ют", "ны", "ть", "ешь", "нно"),
+    ("ила", "ыла", "ена", "ейте", "уйте", "ите", "или", "ыли", "ей", "уй",
+     "ил", "ыл", "им", "ым", "ен", "ило", "ыло", "ено", "ят", "ует", "уют",
+     "ит", "ыт", "ены", "ить", "ыть", "ишь", "ую", "ю"),
+)
+NOUN = ((), (
+    "а", "ев", "ов", "ие", "ье", "е", "иями", "ями", "ами", "еи", "ии", "и",
+    "ией", "ей", "ой", "ий", "й", "иям", "ям", "ием", "ем", "ам", "ом", "о",
+    "у", "ах", "иях", "ях", "ы", "ь", "ию", "ью", "ю", "ия", "ья", "я",
+))
+DERIVATIONAL = ((), ("ост", "ость"))
+SUPERLATIVE = ((), ("ейш", "ейше"))
+
+WORD_RE = re.compile(r"\w+")
+CYRILLIC_RE = re.compile("[а-я]")
+
+
+def _regions(word):
+    """Начала областей RV и R2 (см. описание алгоритма)."""
+    rv = r1 = r2 = len(word)
+    for index, char in enumerate(word):
+        if char in VOWELS:
+            rv = index + 1
+            break
+    for index in range(1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            r1 = index + 1
+            break
+    for index in range(r1 + 1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            r2 = index + 1
+            break
+    return rv, r2
+
+
+def _strip(word, start, groups):
+    """Отрезать самое длинное окончание из ``groups`` внутри ``word[start:]``.
+
+    Окончания первой группы отрезаются, только если перед ними стоит
+    «а» или «я» (тоже внутри области). Возвращает ``None``, если
+    окончание не подошло.
+    """
+    conditional, plain = groups
+    region = word[start:]
+    endings = sorted(conditional + plain, key=len, reverse=True)
+    for ending in endings:
+        if not region.endswith(ending):
+            continue
+        stem = word[:-len(ending)]
+        if ending in conditional and (
+            len(stem) <= start or stem[-1] not in AFTER_A
+        ):
+            return None
+        return stem
+    return None
+
+
+def stem(word):
+    word = word.lower().replace("ё", "е")
+    if not CYRILLIC_RE.search(word):
+        return word
+    rv, r2 = _regions(word)
+    result = _strip(word, rv, PERFECTIVE_GERUND)
+    if result is None:
+        word = _strip(word, rv, REFLEXIVE) or word
+        result = _strip(word, rv, ADJECTIVE)
+        if result is not None:
+            result = _strip(result, rv, PARTICIPLE) or result
+        else:
+            result = _strip(word, rv, VERB)
+            if result is None:
+                result = _strip(word, rv, NOUN)
+    word = word if result is None else result
+    if word[rv:].endswith("и"):
+        word = word[:-1]
+    word = _strip(word, r2, DERIVATIONAL) or word
+    if word[rv:].endswith("нн"):
+        word = word[:-1]
+    else:
+        superlative = _strip(word, rv, SUPERLATIVE)
+        if superlative is not None:
+            word = superlative
+            if word[rv:].endswith("нн"):
+                word = word[:-1]
+        elif word[rv:].endswith("ь"):
+            word = word[:-1]
+    return word
+
+
+def tokens(text):
+    """Слова текста в нижнем регистре, ``ё`` заменена на ``е``."""
+    return WORD_RE.findall(text.lower().replace("ё", "е"))
+
+
+def stems(text):
+    return [stem(token) for token in tokens(text)]
+
+
+def fill_index(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    rows = [
+        (pk, ' '.join(stems(text)))
+        for pk, text in Post.objects.values_list('id', 'text').iterator()
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO posts_search (rowid, terms) VALUES (%s, %s)', rows
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_userstats'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE VIRTUAL TABLE posts_search USING fts5("
+            "terms, tokenize = 'unicode61 remove_diacritics 0')",
+            'DROP TABLE posts_search',
+        ),
+        migrations.RunPython(fill_index, migrations.RunPython.noop),
+    ]
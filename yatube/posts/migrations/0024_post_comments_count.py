@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0023_post_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число комментариев'),
+        ),
+        migrations.RunSQL(
+            'UPDATE posts_post SET comments_count = ('
+            'SELECT COUNT(*) FROM posts_comment'
+            ' WHERE posts_comment.post_id = posts_post.id)',
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -1,14 +1,43 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from core.storage import HashedStorage
+
 User = get_user_model()
 
+FEED_FIELDS = (
+    "id", "text", "pub_date", "updated", "image", "author", "group",
+    "author__username", "author__first_name", "author__last_name",
+    "group__slug", "group__title",
+)
+
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для лент: автор и группа одним JOIN, без лишних колонок."""
+        return self.select_related("author", "group").only(*FEED_FIELDS)
+
+    def for_detail(self):
+        return self.select_related("author__stats", "group")
+
+
+class CommentQuerySet(models.QuerySet):
+    def with_authors(self):
+        return self.select_related("author").only(
+            "id", "text", "created", "post_id", "author__username"
+        )
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200, verbose_name="name")
     slug = models.SlugField(unique=True, blank=True, null=True, default=None,
                             verbose_name="slug")
     description = models.TextField(verbose_name="description")
+    posts_count = models.PositiveIntegerField(
+        "Число постов",
+        default=0,
+        editable=False
+    )
 
     def __str__(self):
         return self.title
@@ -23,6 +52,10 @@ class Post(models.Model):
         "Дата публикации",
         auto_now_add=True
     )
+    updated = models.DateTimeField(
+        "Дата изменения",
+        auto_now=True
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -41,16 +74,39 @@ class Post(models.Model):
     image = models.ImageField(
         "Картинка",
         upload_to="posts/",
+        storage=HashedStorage(),
         blank=True,
         null=True,
         help_text="Загрузите картинку"
     )
+    comments_count = models.PositiveIntegerField(
+        "Число комментариев",
+        default=0,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return self.text[:15]
 
     class Meta:
         ordering = ["-pub_date"]
+        indexes = [
+            models.Index(
+                fields=["-pub_date", "-id"], name="post_pub_date_id_idx"
+            ),
+            models.Index(
+                fields=["author", "-pub_date", "-id"],
+                name="post_author_pub_date_idx"
+            ),
+            models.Index(
+                fields=["group", "-pub_date", "-id"],
+                name="post_group_pub_date_idx"
+            ),
+            # по нему ищутся другие посты с той же картинкой
+            models.Index(fields=["image"], name="post_image_idx"),
+        ]
 
 
 class Comment(models.Model):
@@ -76,6 +132,15 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["post", "created"], name="comment_post_created_idx"
+            ),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -92,3 +157,61 @@ class Follow(models.Model):
         verbose_name="Подписка",
         help_text="Подписка на автора"
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "author"], name="follow_unique_user_author"
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="Читатель"
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="Пост"
+    )
+    # копии полей поста: страница ленты читается по индексу без JOIN
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Автор поста"
+    )
+    pub_date = models.DateTimeField("Дата публикации поста")
+
+    class Meta:
+        unique_together = ("user", "post")
+        indexes = [
+            models.Index(
+                fields=["user", "-pub_date", "-post"],
+                name="timeline_user_pub_date_idx"
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name="stats",
+        verbose_name="Пользователь"
+    )
+    posts_count = models.PositiveIntegerField("Число постов", default=0)
+    comments_count = models.PositiveIntegerField(
+        "Число комментариев",
+        default=0
+    )
+    followers_count = models.PositiveIntegerField(
+        "Число подписчиков",
+        default=0
+    )
+    following_count = models.PositiveIntegerField("Число подписок", default=0)
@@ -0,0 +1,179 @@
+"""Полнотекстовый поиск по постам.
+
+Индекс — виртуальная таблица SQLite FTS5 ``posts_search`` (её создаёт
+миграция), в которой под ``rowid`` поста лежат основы его слов после
+``stemmer``. Поэтому «котами» находит пост про «котов». Результаты
+упорядочены по BM25, а фрагмент текста с подсвеченными словами
+строится в Python по тем же основам. Сигналы обновляют индекс при
+сохранении и удалении поста, полностью его пересобирает команда
+``rebuild_search_index``.
+"""
+import re
+
+from django.db import connection, transaction
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from core.parallel import imap
+
+from .models import Post
+from .stemmer import stem, stems
+
+TABLE = "posts_search"
+SNIPPET_WORDS = 30
+CHUNK = 500
+TOKEN_RE = re.compile(r"\w+")
+
+
+def document(text):
+    """Текст, который кладётся в индекс вместо исходного."""
+    return " ".join(stems(text))
+
+
+def match_expression(query):
+    """Запрос пользователя в синтаксисе FTS5: все основы через AND.
+
+    Каждая основа берётся в кавычки, поэтому операторы FTS5 в запросе
+    ничего не ломают. Пустая строка означает, что искать нечего.
+    """
+    return " ".join(f'"{term}"' for term in dict.fromkeys(stems(query)))
+
+
+def index_posts(rows):
+    """Записать в индекс пары ``(id, text)``."""
+    index_documents([(pk, document(text)) for pk, text in rows])
+
+
+def index_documents(rows):
+    """Записать уже подготовленные пары ``(id, document(text))``."""
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {TABLE} (rowid, terms) VALUES (%s, %s)",
+            rows,
+        )
+
+
+def _documents(rows):
+    return [(pk, document(text)) for pk, text in rows]
+
+
+def _chunks(size):
+    last = 0
+    while True:
+        rows = list(
+            Post.objects.filter(id__gt=last).order_by("id")
+            .values_list("id", "text")[:size]
+        )
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][0]
+
+
+@transaction.atomic
+def rebuild(workers=1, chunk_size=CHUNK):
+    """Пересобрать индекс; основы слов считают ``workers`` процессов.
+
+    Возвращает число проиндексированных постов.
+    """
+    clear()
+    indexed = 0
+    for documents in imap(_documents, _chunks(chunk_size), workers):
+        index_documents(documents)
+        indexed += len(documents)
+    return indexed
+
+
+def remove_posts(ids):
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {TABLE} WHERE rowid = %s", [(pk,) for pk in ids]
+        )
+
+
+def clear():
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+
+
+def count(query):
+    expression = match_expression(query)
+    if not expression:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT COUNT(*) FROM {TABLE} WHERE {TABLE} MATCH %s",
+            [expression],
+        )
+        return cursor.fetchone()[0]
+
+
+def ranked_ids(query, limit=None, offset=0):
+    """id подходящих постов, самые релевантные первыми."""
+    expression = match_expression(query)
+    if not expression:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s"
+            f" ORDER BY bm25({TABLE}), rowid DESC LIMIT %s OFFSET %s",
+            [expression, -1 if limit is None else limit, offset],
+        )
+        return [pk for pk, in cursor.fetchall()]
+
+
+def highlight(text, query, words=SNIPPET_WORDS):
+    """Фрагмент ``text`` вокруг первого совпадения, найденное в ``<mark>``."""
+    terms = set(stems(query))
+    spans = [
+        (match.start(), match.end(),
+         stem(match.group()) in terms)
+        for match in TOKEN_RE.finditer(text)
+    ]
+    first = next((i for i, span in enumerate(spans) if span[2]), 0)
+    start = max(0, min(first - words // 3, len(spans) - words))
+    window = spans[start:start + words]
+    if not window:
+        return escape(text)
+    begin, end = window[0][0], window[-1][1]
+    parts = ["…" if start else ""]
+    position = begin
+    for word_start, word_end, matched in window:
+        if not matched:
+            continue
+        parts.append(escape(text[position:word_start]))
+        parts.append(f"<mark>{escape(text[word_start:word_end])}</mark>")
+        position = word_end
+    parts.append(escape(text[position:end]))
+    parts.append("…" if start + words < len(spans) else "")
+    return mark_safe("".join(parts))
+
+
+class SearchResults:
+    """Результаты поиска для ``Paginator``: считаются и режутся в FTS5.
+
+    Посты среза загружаются одним запросом, у каждого появляется
+    атрибут ``snippet``.
+    """
+
+    def __init__(self, query, queryset):
+        self.query = query
+        self.queryset = queryset
+
+    def count(self):
+        return count(self.query)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start = item.start or 0
+        limit = None if item.stop is None else item.stop - start
+        ids = ranked_ids(self.query, limit, start)
+        posts = self.queryset.in_bulk(ids)
+        found = [posts[pk] for pk in ids if pk in posts]
+        for post in found:
+            post.snippet = highlight(post.text, self.query)
+        return found
@@ -0,0 +1,153 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, feed_cache, jobs, thumbnails, timeline
+from .models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+def create_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_state(sender, instance, raw=False, **kwargs):
+    instance._previous_group_id = instance._previous_image = None
+    instance._previous_text = None
+    if instance.pk and not raw:
+        previous = Post.objects.filter(pk=instance.pk).values_list(
+            "group_id", "image", "text"
+        ).first()
+        if previous:
+            (instance._previous_group_id, instance._previous_image,
+             instance._previous_text) = previous
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.bump_user(instance.author_id, posts_count=1)
+        counters.bump_group(instance.group_id, 1)
+    elif instance._previous_group_id != instance.group_id:
+        counters.bump_group(instance._previous_group_id, -1)
+        counters.bump_group(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, posts_count=-1)
+    counters.bump_group(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_user(instance.author_id, comments_count=1)
+        counters.bump_post(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, comments_count=-1)
+    counters.bump_post(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_user(instance.user_id, following_count=1)
+        counters.bump_user(instance.author_id, followers_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    counters.bump_user(instance.user_id, following_count=-1)
+    counters.bump_user(instance.author_id, followers_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def fanout_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        jobs.push_post.delay(instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        jobs.backfill.delay(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def trim_timeline(sender, instance, **kwargs):
+    jobs.trim.delay(instance.user_id, instance.author_id)
+    # переход через порог виден только сейчас, после уменьшения счётчика
+    followers = timeline.followers_count(instance.author_id)
+    if followers == timeline.fanout_limit() - 1:
+        jobs.author_demoted.delay(instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_post_feeds(sender, instance, raw=False, **kwargs):
+    if not raw:
+        feed_cache.bump_post(
+            instance.author_id,
+            instance.group_id,
+            getattr(instance, "_previous_group_id", None),
+        )
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post_feeds(sender, instance, **kwargs):
+    feed_cache.bump_post(instance.author_id, instance.group_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_feeds(sender, instance, raw=False, **kwargs):
+    if not raw:
+        feed_cache.bump("meta")
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_feeds(sender, instance, created, update_fields=None,
+                          raw=False, **kwargs):
+    if created or raw or update_fields == frozenset({"last_login"}):
+        return
+    feed_cache.bump("meta")
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnails(sender, instance, raw=False, **kwargs):
+    image = instance.image.name if instance.image else None
+    if not raw and image and image != instance._previous_image:
+        thumbnails.schedule_on_commit(image)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, **kwargs):
+    if not raw and instance.text != instance._previous_text:
+        jobs.index_post.delay(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    jobs.index_post.delay(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def release_previous_image(sender, instance, raw=False, **kwargs):
+    previous = instance._previous_image
+    if not raw and previous and previous != instance.image.name:
+        jobs.release_image.delay(previous)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        jobs.release_image.delay(instance.image.name)
@@ -0,0 +1,49 @@
+"""Карточки постов для лент с кешем HTML каждой карточки.
+
+Ключ карточки — ``post.id`` и ``post.updated``: правка поста меняет
+ключ только его карточки. Ещё в ключе поколение ``meta`` из
+``feed_cache``, чтобы переименование группы или автора не оставляло
+старые ссылки и имена. Карточки страницы читаются из кеша одним
+``get_many``, недостающие рендерятся и кладутся одним ``set_many``.
+Карточку с ещё не нарезанным превью не кешируем, иначе в ней надолго
+останется оригинал картинки.
+"""
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts import feed_cache, thumbnails
+
+register = template.Library()
+
+CARD_TEMPLATE = "posts/includes/post_card.html"
+# увеличить при изменении разметки карточки
+CARD_VERSION = 2
+
+
+def card_key(post, meta):
+    updated = int(post.updated.timestamp() * 1_000_000)
+    return f"post_card:{CARD_VERSION}:{meta}:{post.id}:{updated}"
+
+
+@register.simple_tag
+def post_cards(posts):
+    """HTML карточек ``posts`` в том же порядке."""
+    posts = list(posts)
+    meta = feed_cache.generation("meta")
+    keys = [card_key(post, meta) for post in posts]
+    cards = cache.get_many(keys)
+    missing = [
+        (key, post) for key, post in zip(keys, posts) if key not in cards
+    ]
+    if missing:
+        thumbnails.prefetch([post for _, post in missing])
+        fresh = {}
+        for key, post in missing:
+            cards[key] = render_to_string(CARD_TEMPLATE, {"post": post})
+            if thumbnails.ready(post.image):
+                fresh[key] = cards[key]
+        cache.set_many(fresh, settings.POST_CARD_TIMEOUT)
+    return [mark_safe(cards[key]) for key in keys]
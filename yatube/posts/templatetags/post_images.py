@@ -0,0 +1,37 @@
+"""Тег ``{% picture post.image %}``: адаптивная картинка поста.
+
+Для каждого формата, кроме запасного, — ``<source>`` с лесенкой ширин,
+запасной формат идёт в ``srcset`` самого ``<img>``. Пока превью не
+нарезаны, отдаётся оригинал без ``srcset``.
+"""
+from django import template
+from django.conf import settings
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+def _srcset(images):
+    return ", ".join(f"{image.url} {image.width}w" for image in images)
+
+
+@register.inclusion_tag("posts/includes/picture.html")
+def picture(image):
+    variants = thumbnails.variants(image)
+    if not variants:
+        return {"src": image.url}
+    *preferred, fallback = thumbnails.formats()
+    largest = variants[fallback][-1]
+    return {
+        "sources": [
+            {"type": f"image/{name.lower()}",
+             "srcset": _srcset(variants[name])}
+            for name in preferred
+        ],
+        "src": largest.url,
+        "srcset": _srcset(variants[fallback]),
+        "width": largest.width,
+        "height": largest.height,
+        "sizes": settings.THUMBNAIL_SIZES,
+    }
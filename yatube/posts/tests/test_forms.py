@@ -1,10 +1,17 @@
-from django.test import Client, TestCase
+import io
+import os
+import time
+
+from django.test import Client, TestCase, override_settings
+from PIL import Image
 from django.urls import reverse
 from ..models import Post, Comment
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
+from core import jobs
+from .. import uploads
+from ..jobs import release_image
 from ..forms import PostForm
-from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from http import HTTPStatus
 import shutil
@@ -13,7 +20,7 @@ from django.core.cache import cache
 
 User = get_user_model()
 
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
 
 
 class PostsCreateFormTests(TestCase):
@@ -106,3 +113,111 @@ class PostsCreateFormTests(TestCase):
         )
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertEqual(Comment.objects.count(), comments_count)
+
+
+class ImageUploadTest(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.settings = override_settings(
+            MEDIA_ROOT=self.media.name, FILE_UPLOAD_MAX_MEMORY_SIZE=0
+        )
+        self.settings.enable()
+        self.user = User.objects.create_user(username="photographer")
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        self.settings.disable()
+        self.media.cleanup()
+
+    def photo(self, size=(3000, 1000)):
+        """JPEG с EXIF: камера и поворот на 90° по часовой стрелке."""
+        exif = Image.Exif()
+        exif[0x010F] = "Камера"
+        exif[0x0112] = 6
+        buffer = io.BytesIO()
+        Image.new("RGB", size, "red").save(
+            buffer, "JPEG", exif=exif.tobytes()
+        )
+        return SimpleUploadedFile(
+            "photo.jpg", buffer.getvalue(), content_type="image/jpeg"
+        )
+
+    def stored(self):
+        return [
+            os.path.relpath(os.path.join(path, name), self.media.name)
+            for path, _, names in os.walk(self.media.name)
+            for name in names
+        ]
+
+    def create(self, image):
+        return self.client.post(
+            reverse("posts:post_create"), {"text": "Фото", "image": image}
+        )
+
+    def test_image_reencoded(self):
+        """Картинка уменьшена, повёрнута по EXIF и сохранена без EXIF"""
+        self.create(self.photo())
+        post = Post.objects.get()
+        self.assertRegex(
+            post.image.name, r"^posts/(\w\w)/(\w\w)/\1\2[0-9a-f]{60}\.jpg$"
+        )
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, "JPEG")
+            self.assertEqual(image.size, (683, 2048))
+            self.assertEqual(dict(image.getexif()), {})
+
+    def test_duplicate_upload_stored_once(self):
+        self.create(self.photo())
+        self.create(self.photo())
+        first, second = Post.objects.values_list("image", flat=True)
+        self.assertEqual(first, second)
+        self.assertEqual(self.stored(), [first])
+
+    @override_settings(POST_IMAGE_RELEASE_GRACE=0)
+    def test_unused_image_released(self):
+        """Файл удаляется, когда на него не ссылается ни один пост"""
+        self.create(self.photo())
+        self.create(self.photo())
+        first, second = Post.objects.all()
+        image = first.image.name
+        first.delete()
+        jobs.work(burst=True)
+        self.assertEqual(self.stored(), [image])
+        second.image = uploads.clean_image(self.photo(size=(100, 100)))
+        second.save()
+        jobs.work(burst=True)
+        self.assertEqual(self.stored(), [second.image.name])
+
+    def test_reuploaded_image_kept(self):
+        """Файл, который загрузили заново, не удаляется вместе с постом"""
+        self.create(self.photo())
+        post = Post.objects.get()
+        image = post.image.name
+        path = post.image.storage.path(image)
+        hour_ago = time.time() - 60 * 60 - 1
+        os.utime(path, (hour_ago, hour_ago))
+        # та же картинка загружена для поста, который ещё не сохранён
+        post.image.storage.save(
+            "posts/photo.jpg", uploads.clean_image(self.photo())
+        )
+        post.delete()
+        jobs.work(burst=True)
+        self.assertEqual(self.stored(), [image])
+        os.utime(path, (hour_ago, hour_ago))
+        release_image.delay(image)
+        jobs.work(burst=True)
+        self.assertEqual(self.stored(), [])
+
+    def test_limits(self):
+        """Слишком большие файлы и картинки отклоняются до декодирования"""
+        limits = (
+            {"POST_IMAGE_MAX_BYTES": 1000},
+            {"POST_IMAGE_MAX_PIXELS": 1000},
+        )
+        for limit in limits:
+            with self.subTest(limit=limit), override_settings(**limit):
+                response = self.create(self.photo())
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertTrue(response.context["form"].errors["image"])
+        self.assertFalse(Post.objects.exists())
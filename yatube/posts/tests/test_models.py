@@ -1,7 +1,20 @@
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import CommandError, call_command
+from django.db.models import F, Sum
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.storage import is_hashed
 
-from ..models import Group, Post
+from .. import transfer
+from ..models import (
+    Comment, Follow, Group, Post, TimelineEntry, UserStats
+)
 
 User = get_user_model()
 
@@ -63,3 +76,261 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, expected_value)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="auth")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(
+            title="Тестовая группа",
+            slug="Тестовый слаг",
+            description="Тестовое описание",
+        )
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_changes(self):
+        """Счётчики обновляются при создании и удалении объектов"""
+        post = Post.objects.create(
+            author=self.user, text="Пост", group=self.group
+        )
+        Comment.objects.create(post=post, author=self.reader, text="Ок")
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.assertEqual(self.stats(self.user).posts_count, 1)
+        self.assertEqual(self.stats(self.user).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).comments_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        post.comments.all().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        post.group = None
+        post.save()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(self.user).posts_count, 0)
+        self.assertEqual(self.stats(self.reader).comments_count, 0)
+
+    def test_drifted_counter_stays_at_zero(self):
+        """Уменьшение разошедшегося счётчика не роняет удаление"""
+        post = Post.objects.create(author=self.user, text="Пост")
+        UserStats.objects.filter(user=self.user).update(posts_count=0)
+        post.delete()
+        self.assertEqual(self.stats(self.user).posts_count, 0)
+
+    def test_recount_repairs_drift(self):
+        """recount_stats исправляет разошедшиеся счётчики"""
+        post = Post.objects.create(
+            author=self.user, text="Пост", group=self.group
+        )
+        Comment.objects.create(post=post, author=self.reader, text="Ок")
+        UserStats.objects.filter(user=self.user).update(posts_count=42)
+        Group.objects.update(posts_count=7)
+        Post.objects.update(comments_count=5)
+        call_command("recount_stats", stdout=StringIO())
+        self.assertEqual(self.stats(self.user).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+
+class TransferTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.media = tempfile.TemporaryDirectory()
+        self.author = User.objects.create_user(username="author")
+        self.reader = User.objects.create_user(username="reader")
+        self.group = Group.objects.create(
+            title="Группа", slug="transfer", description="Описание"
+        )
+        self.old = timezone.now() - timedelta(days=30)
+        for number in range(5):
+            post = Post.objects.create(
+                author=self.author, group=self.group, text=f"Пост {number}"
+            )
+        Post.objects.update(pub_date=self.old, updated=self.old)
+        Post.objects.filter(pk=post.pk).update(image="posts/cat.gif")
+        os.makedirs(os.path.join(self.media.name, "posts"))
+        with open(os.path.join(self.media.name, "posts/cat.gif"), "wb") as f:
+            f.write(b"GIF89a")
+        Comment.objects.create(post=post, author=self.reader, text="Ок")
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def tearDown(self):
+        self.directory.cleanup()
+        self.media.cleanup()
+
+    def snapshot(self):
+        return (
+            list(Group.objects.values_list("id", "slug", "description")),
+            list(Post.objects.order_by("id").values_list(
+                "id", "text", "pub_date", "updated", "author_id", "group_id",
+                "image",
+            )),
+            list(Comment.objects.values_list("id", "post_id", "text")),
+            list(Follow.objects.values_list("user_id", "author_id")),
+        )
+
+    def delete_all(self):
+        Comment.objects.all().delete()
+        Post.objects.all().delete()
+        Group.objects.all().delete()
+        Follow.objects.all().delete()
+
+    def round_trip(self, file_format):
+        before = self.snapshot()
+        with override_settings(MEDIA_ROOT=self.media.name):
+            call_command(
+                "export_posts", self.directory.name, "--format", file_format,
+                "--chunk-size", "2", "--media", "copy", stdout=StringIO()
+            )
+        self.delete_all()
+        target = tempfile.TemporaryDirectory()
+        with target, override_settings(MEDIA_ROOT=target.name):
+            call_command(
+                "import_posts", self.directory.name, "--format", file_format,
+                "--batch-size", "2", stdout=StringIO()
+            )
+            self.assertTrue(
+                os.path.exists(os.path.join(target.name, "posts/cat.gif"))
+            )
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 5
+        )
+
+    def test_ndjson_round_trip(self):
+        """Выгрузка и загрузка сохраняют данные, даты и картинки"""
+        self.round_trip("ndjson")
+
+    def test_csv_round_trip(self):
+        self.round_trip("csv")
+
+    def test_unknown_tables_rejected(self):
+        for command in ("export_posts", "import_posts"):
+            with self.subTest(command=command):
+                with self.assertRaisesMessage(
+                    CommandError, "таблицы: nope; доступны: groups, posts"
+                ):
+                    call_command(command, self.directory.name,
+                                 "--tables", "posts,nope")
+
+    def test_import_resumes_from_checkpoint(self):
+        """Загрузка продолжается с последней записанной пачки"""
+        transfer.export_table(self.directory.name, "posts")
+        Post.objects.all().delete()
+        transfer.write_checkpoint(self.directory.name, "posts", {"rows": 3})
+        transfer.import_table(
+            self.directory.name, "posts", batch_size=2, media="skip",
+            resume=True
+        )
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertIsNone(
+            transfer.read_checkpoint(self.directory.name, "posts")
+        )
+
+
+class MigrateMediaTest(TestCase):
+    def test_old_images_moved(self):
+        """Старые картинки переезжают в каталоги по хешу, копии сливаются"""
+        media = tempfile.TemporaryDirectory()
+        author = User.objects.create_user(username="author")
+        names = ["posts/a.gif", "posts/b.gif", "posts/lost.gif"]
+        for name in names + names[:1]:
+            post = Post.objects.create(author=author, text="Пост")
+            Post.objects.filter(pk=post.pk).update(image=name)
+        os.makedirs(os.path.join(media.name, "posts"))
+        for name in names[:2]:
+            with open(os.path.join(media.name, name), "wb") as file:
+                file.write(b"GIF89a")
+        with media, override_settings(MEDIA_ROOT=media.name):
+            output = StringIO()
+            call_command(
+                "migrate_media", "--workers", "1", "--chunk-size", "2",
+                stdout=output,
+            )
+            self.assertIn("Перенесено картинок: 2, без файла: 1",
+                          output.getvalue())
+            images = Post.objects.values_list("image", flat=True)
+            moved = set(images) - {"posts/lost.gif"}
+            self.assertEqual(len(moved), 1)
+            self.assertTrue(is_hashed(moved.pop()))
+            self.assertEqual(len(os.listdir(
+                os.path.join(media.name, "posts")
+            )), 1)
+
+
+class SeedTest(TestCase):
+    def seed(self, *arguments):
+        call_command(
+            "seed", "--users", "20", "--groups", "3", "--posts", "60",
+            "--comments", "30", "--follows-per-user", "4", "--workers", "1",
+            "--until", "2026-01-01", *arguments, stdout=StringIO()
+        )
+
+    def snapshot(self):
+        return list(Post.objects.order_by("id").values_list(
+            "text", "pub_date", "author__username", "group__slug", "image"
+        ))
+
+    def test_same_seed_same_data(self):
+        """Одинаковый seed даёт одинаковые данные"""
+        self.seed()
+        first = self.snapshot()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed()
+        self.assertEqual(self.snapshot(), first)
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed("--random-seed", "1")
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_generated_data(self):
+        media = tempfile.TemporaryDirectory()
+        with media, override_settings(MEDIA_ROOT=media.name):
+            self.seed("--images", "0.5")
+            images = set(Post.objects.exclude(image="").values_list(
+                "image", flat=True
+            ))
+            self.assertTrue(images)
+            for name in images:
+                self.assertTrue(
+                    os.path.exists(os.path.join(media.name, name))
+                )
+        until = timezone.datetime(2026, 1, 1, tzinfo=timezone.utc)
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertFalse(Post.objects.filter(
+            pub_date__lt=until - timedelta(days=365)
+        ).exists())
+        self.assertFalse(Post.objects.filter(pub_date__gt=until).exists())
+        for comment in Comment.objects.select_related("post"):
+            self.assertGreaterEqual(comment.created, comment.post.pub_date)
+        self.assertFalse(
+            Follow.objects.filter(user_id=F("author_id")).exists()
+        )
+        stats = UserStats.objects.aggregate(
+            posts=Sum("posts_count"), followers=Sum("followers_count")
+        )
+        self.assertEqual(stats["posts"], 60)
+        self.assertEqual(stats["followers"], Follow.objects.count())
+        self.assertEqual(
+            Post.objects.aggregate(total=Sum("comments_count"))["total"],
+            Comment.objects.count(),
+        )
+        follow = Follow.objects.first()
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user_id=follow.user_id, post__author_id=follow.author_id
+            ).count(),
+            Post.objects.filter(author_id=follow.author_id).count(),
+        )
@@ -1,18 +1,31 @@
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import Client, RequestFactory, TestCase, override_settings
 from django.urls import reverse
 from django import forms
 from django.shortcuts import get_object_or_404
-from ..models import Group, Post, Comment
+from unittest import mock
+from .. import feed_cache, search, thumbnails
+from ..templatetags import post_cards
+from ..utils import KeysetPaginator
+from ..models import Group, Post, Comment, Follow, TimelineEntry
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+import base64
+import json
+import os
 import shutil
+from io import StringIO
 import tempfile
+import time
 from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from core.query_plans import full_scans
 
 User = get_user_model()
 
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
 
 
 class PostsPagesTests(TestCase):
@@ -271,3 +284,637 @@ class PostsPagesTests(TestCase):
         response2 = self.authorized_client.get(reverse("posts:follow_index"))
         follow_posts2 = response2.context["page_obj"]
         self.assertNotIn(test_post2, follow_posts2)
+
+
+class PaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="auth")
+        cls.group = Group.objects.create(
+            title="Тестовая группа",
+            slug="Test_slug",
+            description="Тестовое описание",
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, group=cls.group, text=f"Пост {i}")
+            for i in range(13)
+        )
+        # одинаковая дата у всех постов проверяет сортировку по id
+        Post.objects.update(pub_date=Post.objects.first().pub_date)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_keyset_pages(self):
+        """Курсоры листают ленту вперёд и назад без потерь"""
+        pages = {
+            reverse("posts:home_page"),
+            reverse("posts:group_posts", kwargs={"slug": "Test_slug"}),
+            reverse("posts:profile", kwargs={"username": "auth"}),
+        }
+        for url in pages:
+            with self.subTest(url=url):
+                first = self.client.get(url).context["page_obj"]
+                self.assertEqual(len(first), 10)
+                self.assertTrue(first.has_next())
+                second = self.client.get(
+                    url, {"cursor": first.next_cursor}
+                ).context["page_obj"]
+                self.assertEqual(len(second), 3)
+                self.assertFalse(second.has_next())
+                ids = [post.id for post in first] + [
+                    post.id for post in second
+                ]
+                self.assertEqual(
+                    ids, sorted(Post.objects.values_list("id", flat=True),
+                                reverse=True)
+                )
+                back = self.client.get(
+                    url, {"cursor": second.previous_cursor}
+                ).context["page_obj"]
+                self.assertEqual(list(back), list(first))
+
+    def test_empty_previous_page(self):
+        """Пустая страница «назад» не ссылается на ?cursor=None"""
+        newest = Post.objects.order_by("-pub_date", "-id").first()
+        cursor = KeysetPaginator(Post.objects.all(), 10).encode_cursor(
+            newest, "prev"
+        )
+        response = self.client.get(
+            reverse("posts:home_page"), {"cursor": cursor}
+        )
+        self.assertFalse(response.context["page_obj"].has_next())
+        self.assertNotContains(response, "cursor=None")
+
+    def test_page_number_links(self):
+        """Старые ссылки ?page=N продолжают работать"""
+        response = self.client.get(reverse("posts:home_page"), {"page": 2})
+        self.assertEqual(len(response.context["page_obj"]), 3)
+
+    def test_broken_cursor(self):
+        """Испорченный курсор открывает первую страницу"""
+        response = self.client.get(
+            reverse("posts:home_page"), {"cursor": "broken"}
+        )
+        self.assertEqual(len(response.context["page_obj"]), 10)
+
+    def test_cursor_with_null_values(self):
+        """Курсор с null вместо значений открывает первую страницу"""
+        for values in (["next", None, None], ["prev", None, 1],
+                       ["next", "2020-01-01T00:00:00+00:00", None]):
+            cursor = base64.urlsafe_b64encode(
+                json.dumps(values).encode()
+            ).decode()
+            with self.subTest(values=values):
+                response = self.client.get(
+                    reverse("posts:home_page"), {"cursor": cursor}
+                )
+                self.assertEqual(len(response.context["page_obj"]), 10)
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username="reader")
+        cls.author = User.objects.create_user(username="author")
+        cls.old_post = Post.objects.create(author=cls.author, text="Старый")
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def feed(self):
+        response = self.client.get(reverse("posts:follow_index"))
+        return list(response.context["page_obj"])
+
+    def test_follow_backfills_and_unfollow_trims(self):
+        """Подписка догружает ленту, отписка очищает её"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(author=self.author, text="Новый")
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+        Follow.objects.filter(user=self.reader, author=self.author).delete()
+        self.assertEqual(self.feed(), [])
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_popular_author_read_on_fanout(self):
+        """Посты популярного автора подмешиваются при чтении"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(author=self.author, text="Новый")
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_pages_merge_popular_authors(self):
+        """Курсор листает ленту из записей и постов популярного автора"""
+        star = User.objects.create_user(username="star")
+        fan = User.objects.create_user(username="fan")
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=star)
+        Follow.objects.create(user=fan, author=star)
+        for number in range(8):
+            Post.objects.create(author=self.author, text=f"Обычный {number}")
+            Post.objects.create(author=star, text=f"Звезда {number}")
+        expected = list(Post.objects.filter(
+            author__in=[self.author, star]
+        ).order_by("-pub_date", "-id"))
+        url = reverse("posts:follow_index")
+        first = self.client.get(url).context["page_obj"]
+        second = self.client.get(
+            url, {"cursor": first.next_cursor}
+        ).context["page_obj"]
+        self.assertEqual(list(first) + list(second), expected)
+        self.assertFalse(second.has_next())
+        back = self.client.get(
+            url, {"cursor": second.previous_cursor}
+        ).context["page_obj"]
+        self.assertEqual(list(back), list(first))
+
+    @override_settings(JOBS_ALWAYS_EAGER=False)
+    def test_fanout_runs_in_workers(self):
+        """Раскладка по лентам ждёт воркеров очереди"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(author=self.author, text="Новый")
+        self.assertEqual(self.feed(), [])
+        call_command("run_workers", "--burst", stdout=StringIO())
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+
+
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="auth")
+        cls.post = Post.objects.create(author=cls.user, text="Пост")
+        for number in range(25):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f"Комментарий {number}"
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_comments_paginated(self):
+        """На странице поста первые 20 комментариев, остальные по курсору"""
+        response = self.client.get(
+            reverse("posts:post_detail", kwargs={"post_id": self.post.id})
+        )
+        comments = response.context["comments"]
+        self.assertEqual(len(comments), 20)
+        self.assertEqual(comments[0].text, "Комментарий 0")
+        self.assertEqual(response.context["post"].comments_count, 25)
+        fragment = self.client.get(
+            reverse("posts:post_comments", kwargs={"post_id": self.post.id}),
+            {"cursor": comments.next_cursor},
+        )
+        texts = [comment.text for comment in fragment.context["comments"]]
+        self.assertEqual(
+            texts, [f"Комментарий {number}" for number in range(20, 25)]
+        )
+        self.assertNotContains(fragment, "Показать ещё")
+        self.assertTemplateNotUsed(fragment, "base.html")
+
+    def test_fragment_for_missing_post(self):
+        response = self.client.get(
+            reverse("posts:post_comments", kwargs={"post_id": 0})
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryCountTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username="reader")
+        for i in range(12):
+            author = User.objects.create_user(
+                username=f"author{i}", first_name="Имя", last_name="Фамилия"
+            )
+            group = Group.objects.create(
+                title=f"Группа {i}", slug=f"group{i}", description="-"
+            )
+            Follow.objects.create(user=cls.reader, author=author)
+            cls.post = Post.objects.create(
+                author=author, group=group, text=f"Пост {i}"
+            )
+            Comment.objects.create(post=cls.post, author=author, text="-")
+            Comment.objects.create(post=cls.post, author=cls.reader, text="-")
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_feed_query_count(self):
+        """Число запросов на страницу не зависит от числа постов"""
+        pages = {
+            reverse("posts:home_page"): 1,
+            reverse("posts:group_posts", kwargs={"slug": "group11"}): 3,
+            reverse("posts:profile", kwargs={"username": "author11"}): 3,
+            reverse("posts:post_detail", kwargs={"post_id": self.post.id}): 3,
+        }
+        for url, queries in pages.items():
+            with self.subTest(url=url), self.assertNumQueries(queries):
+                self.guest_client.get(url)
+
+    def test_follow_feed_query_count(self):
+        """Лента подписок: сессия, пользователь, популярные авторы, посты"""
+        with self.assertNumQueries(4):
+            response = self.authorized_client.get(
+                reverse("posts:follow_index")
+            )
+        self.assertEqual(len(response.context["page_obj"]), 10)
+
+
+class FeedCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="auth")
+        cls.group = Group.objects.create(
+            title="Тестовая группа",
+            slug="Test_slug",
+            description="Тестовое описание",
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text="Первый", group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_cached_page_skips_database(self):
+        """Повторный запрос ленты не обращается к БД"""
+        self.client.get(reverse("posts:home_page"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("posts:home_page"))
+        self.assertEqual(list(response.context["page_obj"]), [self.post])
+
+    def test_changes_invalidate_feeds(self):
+        """Новый, изменённый и удалённый пост сразу видны в лентах"""
+        urls = (
+            reverse("posts:home_page"),
+            reverse("posts:group_posts", kwargs={"slug": "Test_slug"}),
+            reverse("posts:profile", kwargs={"username": "auth"}),
+        )
+        for url in urls:
+            self.client.get(url)
+        new_post = Post.objects.create(
+            author=self.user, text="Второй", group=self.group
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                page = self.client.get(url).context["page_obj"]
+                self.assertEqual(list(page), [new_post, self.post])
+        new_post.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                page = self.client.get(url).context["page_obj"]
+                self.assertEqual(list(page), [self.post])
+
+    def test_group_change_invalidates(self):
+        """Изменение группы сбрасывает кеш лент"""
+        url = reverse("posts:home_page")
+        self.client.get(url)
+        self.group.slug = "new_slug"
+        self.group.save()
+        page = self.client.get(url).context["page_obj"]
+        self.assertEqual(page[0].group.slug, "new_slug")
+
+    def test_busy_rebuild_never_serves_old_generation(self):
+        """Пока страницу пересобирают, прошлое поколение не отдаётся"""
+        url = reverse("posts:home_page")
+        self.client.get(url)
+        new_post = Post.objects.create(author=self.user, text="Второй")
+        request = RequestFactory().get(url)
+        lock = f"{feed_cache._page_key(('meta', 'all'), request)}:lock"
+        cache.add(lock, 1, 60)
+        started = time.monotonic()
+        with self.settings(FEED_CACHE_FRESH=0):
+            page = self.client.get(url).context["page_obj"]
+        # чужая пересборка не держит читателя LOCK_TIMEOUT секунд
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(list(page), [new_post, self.post])
+        # у страницы истёк только срок свежести: отдаётся без пересборки
+        with self.assertNumQueries(0):
+            page = self.client.get(url).context["page_obj"]
+        self.assertEqual(list(page), [new_post, self.post])
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="auth")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(
+            title="Тестовая группа", slug="etag", description="Описание"
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text="Пост", group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.urls = (
+            reverse("posts:home_page"),
+            reverse("posts:group_posts", kwargs={"slug": "etag"}),
+            reverse("posts:profile", kwargs={"username": "auth"}),
+            reverse("posts:post_detail", kwargs={"post_id": self.post.id}),
+        )
+
+    def revalidate(self, url, response):
+        return self.client.get(
+            url, HTTP_IF_NONE_MATCH=response["ETag"]
+        ).status_code
+
+    def test_unchanged_page_not_modified(self):
+        """Повторный запрос с ETag получает 304"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn("Last-Modified", response)
+                self.assertIn("Cookie", response["Vary"])
+                self.assertEqual(self.revalidate(url, response), 304)
+
+    def test_changes_change_etag(self):
+        """Правка поста и новый комментарий меняют ETag"""
+        responses = [self.client.get(url) for url in self.urls]
+        Post.objects.get(pk=self.post.pk).save()
+        for url, response in zip(self.urls, responses):
+            with self.subTest(url=url):
+                self.assertEqual(self.revalidate(url, response), 200)
+        url = self.urls[-1]
+        response = self.client.get(url)
+        Comment.objects.create(post=self.post, author=self.reader, text="Ок")
+        self.assertEqual(self.revalidate(url, response), 200)
+
+    def test_etag_depends_on_user(self):
+        """Гость и пользователь получают разные ETag"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.client.force_login(self.reader)
+                self.assertEqual(self.revalidate(url, response), 200)
+                self.client.logout()
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="auth")
+        cls.posts = [
+            Post.objects.create(author=cls.user, text=f"Пост {number}")
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def get_index(self):
+        with mock.patch.object(
+            post_cards, "render_to_string",
+            wraps=post_cards.render_to_string,
+        ) as render, mock.patch.object(
+            post_cards, "cache", wraps=cache
+        ) as card_cache:
+            response = self.client.get(reverse("posts:home_page"))
+        self.assertEqual(card_cache.get_many.call_count, 1)
+        return response, render.call_count
+
+    def test_cards_rendered_once(self):
+        """Карточки берутся из кеша одним get_many"""
+        self.assertEqual(self.get_index()[1], 3)
+        response, rendered = self.get_index()
+        self.assertEqual(rendered, 0)
+        self.assertContains(response, "Пост 2")
+
+    def test_edit_invalidates_own_card(self):
+        """Правка поста перерисовывает только его карточку"""
+        self.get_index()
+        post = Post.objects.get(pk=self.posts[0].pk)
+        post.text = "Исправленный пост"
+        post.save()
+        response, rendered = self.get_index()
+        self.assertEqual(rendered, 1)
+        self.assertContains(response, "Исправленный пост")
+
+    def test_author_rename_invalidates_cards(self):
+        self.get_index()
+        self.user.first_name = "Лев"
+        self.user.save()
+        response, rendered = self.get_index()
+        self.assertEqual(rendered, 3)
+        self.assertContains(response, "Лев")
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    THUMBNAIL_KVSTORE_PATH=os.path.join(TEMP_MEDIA_ROOT, "kvstore.sqlite3"),
+)
+class ThumbnailPipelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="auth")
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text="С картинкой",
+            image=SimpleUploadedFile(
+                name="thumb.gif",
+                content=(
+                    b"\x47\x49\x46\x38\x39\x61\x02\x00"
+                    b"\x01\x00\x80\x00\x00\x00\x00\x00"
+                    b"\xFF\xFF\xFF\x21\xF9\x04\x00\x00"
+                    b"\x00\x00\x00\x2C\x00\x00\x00\x00"
+                    b"\x02\x00\x01\x00\x00\x02\x02\x0C"
+                    b"\x0A\x00\x3B"
+                ),
+                content_type="image/gif"
+            )
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feed_does_not_resize_in_request(self):
+        """Лента отдаёт оригинал, пока превью не нарезано заранее"""
+        response = Client().get(reverse("posts:home_page"))
+        self.assertContains(response, self.post.image.url)
+        thumbnails.generate(self.post.image.name)
+        cache.clear()
+        response = Client().get(reverse("posts:home_page"))
+        self.assertNotContains(response, self.post.image.url)
+        self.assertContains(response, "/media/cache/")
+
+    def test_picture_srcset(self):
+        """Карточка отдаёт лесенку ширин превью через srcset"""
+        thumbnails.generate(self.post.image.name)
+        self.addCleanup(thumbnails.default.kvstore.clear)
+        response = Client().get(reverse("posts:home_page"))
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, settings.THUMBNAIL_SIZES)
+        for width in settings.THUMBNAIL_WIDTHS:
+            self.assertContains(response, f".jpg {width}w")
+        with mock.patch.object(thumbnails.features, "check", return_value=1):
+            self.assertEqual(thumbnails.formats(), ["WEBP", "JPEG"])
+        with mock.patch.object(thumbnails.features, "check", return_value=0):
+            self.assertEqual(thumbnails.formats(), ["JPEG"])
+
+    def test_card_cached_only_with_thumbnail(self):
+        """Карточка с ещё не нарезанным превью не кешируется"""
+        key = post_cards.card_key(
+            Post.objects.get(pk=self.post.pk), feed_cache.generation("meta")
+        )
+        Client().get(reverse("posts:home_page"))
+        self.assertIsNone(cache.get(key))
+        thumbnails.generate(self.post.image.name)
+        self.addCleanup(thumbnails.default.kvstore.clear)
+        feed_cache.bump("all")
+        Client().get(reverse("posts:home_page"))
+        self.assertIn("/media/cache/", cache.get(key))
+
+    def test_shared_image_warmed_once(self):
+        """Картинка нескольких постов нарезается один раз"""
+        Post.objects.create(
+            author=self.user, text="Та же картинка", image=self.post.image.name
+        )
+        self.addCleanup(thumbnails.default.kvstore.clear)
+        out = StringIO()
+        call_command("warm_thumbnails", "--workers", "1", stdout=out)
+        self.assertIn("Готово картинок: 1,", out.getvalue())
+
+    def test_store_rebuilds_from_media(self):
+        """Сведения о превью восстанавливаются по файлам в MEDIA_ROOT"""
+        thumbnails.generate(self.post.image.name)
+        store = thumbnails.default.kvstore
+        store.clear()
+        self.assertEqual(store._find_keys_raw(""), [])
+        Post.objects.create(
+            author=self.user, text="Та же картинка", image=self.post.image.name
+        )
+        out = StringIO()
+        call_command("rebuild_thumbnail_store", stdout=out)
+        found = len(thumbnails.presets())
+        self.assertIn(f"Найдено превью: {found},", out.getvalue())
+        cache.clear()
+        with self.assertNumQueries(1):
+            response = Client().get(reverse("posts:home_page"))
+        self.assertContains(response, "/media/cache/")
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="auth")
+        cls.cats = Post.objects.create(
+            author=cls.user, text="Мои коты спят на подоконнике"
+        )
+        cls.dogs = Post.objects.create(
+            author=cls.user, text="Собака гуляет во дворе"
+        )
+
+    def test_search_uses_stems(self):
+        """Поиск находит другие формы слова и подсвечивает их"""
+        response = Client().get(
+            reverse("posts:post_search"), {"q": "котами"}
+        )
+        self.assertEqual(list(response.context["page_obj"]), [self.cats])
+        self.assertContains(response, "<mark>коты</mark>")
+
+    def test_index_follows_edits(self):
+        """Индекс обновляется при изменении и удалении поста"""
+        self.dogs.text = "Кот гуляет сам по себе"
+        self.dogs.save()
+        self.assertEqual(
+            sorted(search.ranked_ids("кот")),
+            [self.cats.id, self.dogs.id]
+        )
+        self.assertEqual(search.ranked_ids("собака"), [])
+        Post.objects.filter(pk=self.cats.pk).delete()
+        self.assertEqual(search.ranked_ids("кот"), [self.dogs.id])
+
+    def test_rebuild_command(self):
+        """Команда пересобирает индекс целиком"""
+        search.clear()
+        call_command(
+            "rebuild_search_index", "--workers", "1", stdout=StringIO()
+        )
+        self.assertEqual(search.ranked_ids("спят"), [self.cats.id])
+
+    def test_admin_uses_index(self):
+        """Поиск в админке идёт по индексу"""
+        admin = User.objects.create_superuser("admin", "a@a.ru", "pass")
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse("admin:posts_post_changelist"), {"q": "собаки"}
+        )
+        self.assertEqual(
+            list(response.context["cl"].result_list), [self.dogs]
+        )
+
+
+class QueryPlanTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="reader")
+        cls.author = User.objects.create_user(username="writer")
+        cls.group = Group.objects.create(
+            title="Группа", slug="plans", description="Описание"
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.author, group=cls.group, text=f"Пост {i}")
+            for i in range(15)
+        )
+        cls.post = Post.objects.create(author=cls.author, text="Кот")
+        Comment.objects.create(post=cls.post, author=cls.user, text="Да")
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_views_use_indexes(self):
+        """Запросы страниц не читают таблицы целиком"""
+        first = self.client.get(reverse("posts:home_page"))
+        cursor = first.context["page_obj"].next_cursor
+        # ленты идут по индексу без сортировки; подписки и поиск
+        # сортируют только найденные по индексу строки
+        urls = {
+            reverse("posts:home_page"): True,
+            reverse("posts:home_page") + f"?cursor={cursor}": True,
+            reverse("posts:group_posts", args=[self.group.slug]): True,
+            reverse("posts:profile", args=[self.author.username]): True,
+            reverse("posts:post_detail", args=[self.post.id]): True,
+            reverse("posts:follow_index"): False,
+            reverse("posts:post_search") + "?q=кот": False,
+        }
+        for url, sorts in urls.items():
+            with self.subTest(url=url):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+                self.assertEqual(
+                    full_scans(queries.captured_queries, sorts=sorts), []
+                )
@@ -0,0 +1,119 @@
+"""Хранилище метаданных превью sorl-thumbnail в общем файле SQLite.
+
+Стандартное хранилище sorl держит записи в кеше Django и в БД, поэтому
+каждый воркер после перезапуска снова ходит в БД и на диск. Здесь все
+воркеры читают один файл ``THUMBNAIL_KVSTORE_PATH``, а найденные записи
+о превью запоминаются в процессе: однажды нарезанное превью не
+меняется. ``prefetch`` загружает записи для целой страницы одним
+запросом.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from sorl.thumbnail.kvstores.base import KVStoreBase, add_prefix
+from sorl.thumbnail.conf import settings as sorl_settings
+
+from core.sqlite import LocalConnection
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS kvstore ("
+    " key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+)
+IMAGE_MARK = "||image||"
+CHUNK = 500
+
+
+class SQLiteKVStore(KVStoreBase):
+    MEMO_SIZE = 20000
+
+    def __init__(self):
+        super().__init__()
+        self._connections = {}
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def _db(self):
+        path = settings.THUMBNAIL_KVSTORE_PATH
+        if path not in self._connections:
+            self._connections[path] = LocalConnection(path, SCHEMA)
+        return self._connections[path].get()
+
+    @staticmethod
+    def _memo_key(key):
+        # память процесса привязана к файлу хранилища
+        return settings.THUMBNAIL_KVSTORE_PATH, key
+
+    def _remember(self, key, value):
+        if IMAGE_MARK not in key:
+            return
+        key = self._memo_key(key)
+        with self._lock:
+            self._memo[key] = value
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.MEMO_SIZE:
+                self._memo.popitem(last=False)
+
+    def _forget(self, keys):
+        with self._lock:
+            for key in keys:
+                self._memo.pop(self._memo_key(key), None)
+
+    def _get_raw(self, key):
+        with self._lock:
+            value = self._memo.get(self._memo_key(key))
+        if value is not None:
+            return value
+        row = self._db.execute(
+            "SELECT value FROM kvstore WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._remember(key, row[0])
+        return row[0]
+
+    def _set_raw(self, key, value):
+        self._db.execute(
+            "INSERT INTO kvstore (key, value) VALUES (?, ?)"
+            " ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+        self._remember(key, value)
+
+    def _delete_raw(self, *keys):
+        self._db.executemany(
+            "DELETE FROM kvstore WHERE key = ?", [(key,) for key in keys]
+        )
+        self._forget(keys)
+
+    def _find_keys_raw(self, prefix):
+        rows = self._db.execute(
+            "SELECT key FROM kvstore WHERE key >= ? AND key < ?",
+            (prefix, prefix + "\U0010ffff"),
+        )
+        return [key for key, in rows]
+
+    def prefetch(self, image_files):
+        """Загрузить записи о нескольких картинках одним запросом."""
+        with self._lock:
+            keys = [
+                key for key in (
+                    add_prefix(image_file.key) for image_file in image_files
+                ) if self._memo_key(key) not in self._memo
+            ]
+        for start in range(0, len(keys), CHUNK):
+            chunk = keys[start:start + CHUNK]
+            marks = ", ".join("?" * len(chunk))
+            rows = self._db.execute(
+                f"SELECT key, value FROM kvstore WHERE key IN ({marks})",
+                chunk,
+            )
+            for key, value in rows:
+                self._remember(key, value)
+
+    def clear(self, delete_thumbnails=False):
+        keys = self._find_keys_raw(sorl_settings.THUMBNAIL_KEY_PREFIX)
+        if delete_thumbnails:
+            self.delete_all_thumbnail_files()
+        self._delete_raw(*keys)
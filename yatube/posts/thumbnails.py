@@ -0,0 +1,199 @@
+"""Фоновая нарезка превью картинок постов.
+
+Шаблоны по-прежнему пользуются тегом ``{% thumbnail %}``, но через
+``DeferredThumbnailBackend``: он отдаёт только готовые превью, а для
+отсутствующих ставит нарезку в пул потоков и пока возвращает оригинал
+(с ``THUMBNAIL_ALWAYS_EAGER`` нарезает сразу, в том же потоке).
+Превью всех вариантов (``presets``) готовятся заранее, сразу после
+сохранения поста.
+
+Вариант — ширина из ``THUMBNAIL_WIDTHS`` в формате из
+``THUMBNAIL_FORMATS`` при пропорциях ``THUMBNAIL_CARD_SIZE``. Тег
+``{% picture %}`` отдаёт их браузеру через ``srcset``, и телефон
+скачивает узкое превью, а не карточку во всю ширину. WebP
+пропускается, если Pillow собран без него.
+
+Ключи sorl зависят от класса хранилища исходника, поэтому картинка
+по имени всегда открывается в хранилище поля ``Post.image`` (``source``)
+— так же, как её видит шаблон через ``FieldFile``.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, transaction
+from PIL import features
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+class DeferredThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который никогда не режет картинку в запросе."""
+
+    def thumbnail_name(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault("format", self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return self._get_thumbnail_filename(source, geometry_string, options)
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError("falsey file_ argument in get_thumbnail()")
+        name = self.thumbnail_name(file_, geometry_string, **options)
+        cached = default.kvstore.get(ImageFile(name, default.storage))
+        if cached:
+            return cached
+        schedule_on_commit(getattr(file_, "name", file_))
+        return ImageFile(file_)
+
+
+def source(image_name, storage=None):
+    """Исходная картинка поста по имени файла."""
+    if storage is None:
+        storage = apps.get_model("posts", "Post")._meta.get_field(
+            "image"
+        ).storage
+    return ImageFile(image_name, storage)
+
+
+def forget(image_name, storage=None):
+    """Удалить превью картинки и сведения о них."""
+    default.kvstore.delete(source(image_name, storage))
+
+
+def formats():
+    """Форматы превью по убыванию предпочтения; последний — запасной."""
+    return [
+        name for name in settings.THUMBNAIL_FORMATS
+        if name != "WEBP" or features.check("webp")
+    ]
+
+
+def presets():
+    """Геометрии и параметры sorl всех вариантов превью."""
+    card_width, card_height = settings.THUMBNAIL_CARD_SIZE
+    return [
+        (f"{width}x{round(width * card_height / card_width)}",
+         {"crop": "center", "upscale": True, "format": file_format})
+        for file_format in formats()
+        for width in settings.THUMBNAIL_WIDTHS
+    ]
+
+
+def variants(image):
+    """Готовые превью картинки: ``{формат: [превью по ширине]}``.
+
+    ``None``, если нарезаны ещё не все: нарезка уже поставлена в пул.
+    """
+    backend = DeferredThumbnailBackend()
+    result = {}
+    for geometry, options in presets():
+        thumbnail = backend.get_thumbnail(image, geometry, **options)
+        if thumbnail.name == image.name:
+            return None
+        result.setdefault(options["format"], []).append(thumbnail)
+    return result
+
+
+def prefetch(posts):
+    """Подгрузить одним запросом сведения о превью постов страницы."""
+    store = default.kvstore
+    if not hasattr(store, "prefetch"):
+        return
+    backend = DeferredThumbnailBackend()
+    store.prefetch([
+        ImageFile(backend.thumbnail_name(post.image, geometry, **options),
+                  default.storage)
+        for post in posts if post.image
+        for geometry, options in presets()
+    ])
+
+
+def ready(image):
+    """Нарезаны ли уже все превью картинки; без картинки — да."""
+    if not image:
+        return True
+    backend = DeferredThumbnailBackend()
+    return all(
+        default.kvstore.get(ImageFile(
+            backend.thumbnail_name(image, geometry, **options),
+            default.storage,
+        ))
+        for geometry, options in presets()
+    )
+
+
+def generate(image_name):
+    """Нарезать все варианты превью картинки."""
+    backend = ThumbnailBackend()
+    for geometry, options in presets():
+        backend.get_thumbnail(source(image_name), geometry, **options)
+
+
+def _generate(image_name):
+    started = time.perf_counter()
+    try:
+        generate(image_name)
+        metrics.observe(
+            "yatube_thumbnail_duration_seconds",
+            time.perf_counter() - started,
+        )
+    except Exception:
+        logger.warning("Не удалось нарезать превью %s", image_name,
+                       exc_info=True)
+
+
+def _run(image_name):
+    try:
+        _generate(image_name)
+    finally:
+        _pending.discard(image_name)
+        connections.close_all()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "THUMBNAIL_WORKERS", 2),
+                thread_name_prefix="thumbnails",
+            )
+    return _executor
+
+
+def schedule(image_name):
+    """Поставить нарезку превью в фоновый пул, если её там ещё нет."""
+    if not image_name or image_name in _pending:
+        return
+    if settings.THUMBNAIL_ALWAYS_EAGER:
+        # тесты: файлы пишутся, пока MEDIA_ROOT ещё переопределён
+        _generate(image_name)
+        return
+    _pending.add(image_name)
+    _get_executor().submit(_run, image_name)
+
+
+def schedule_on_commit(image_name):
+    """Запустить нарезку, когда пост (и картинка) видны другим соединениям."""
+    transaction.on_commit(lambda: schedule(image_name))
@@ -0,0 +1,161 @@
+"""Материализованная лента подписок (fan-out-on-write).
+
+Новый пост раскладывается в ``TimelineEntry`` каждого подписчика автора,
+поэтому лента ``follow_index`` читается по индексу без JOIN с ``Follow``.
+В записи скопированы автор и дата поста: страница ленты — это диапазон
+индекса (user, -pub_date, -post) по курсору, без JOIN и сортировки.
+Для авторов, у которых подписчиков не меньше ``TIMELINE_FANOUT_LIMIT``,
+раскладка не делается: их посты подмешиваются в ленту при чтении,
+тоже по курсору.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import FEED_FIELDS, Follow, Post, TimelineEntry, UserStats
+from .utils import FEED_ORDERING, POSTS_PER_PAGE, KeysetPaginator
+
+BATCH_SIZE = 1000
+TIMELINE_ORDERING = ("-pub_date", "-post_id")
+
+
+def fanout_limit():
+    return getattr(settings, "TIMELINE_FANOUT_LIMIT", 10000)
+
+
+def followers_count(author_id):
+    return UserStats.objects.filter(user_id=author_id).values_list(
+        "followers_count", flat=True
+    ).first() or 0
+
+
+def is_celebrity(author_id):
+    return followers_count(author_id) >= fanout_limit()
+
+
+def _insert(entries):
+    # размер пачки выбирает Django: SQLite не принимает больше 500
+    # строк в одном INSERT ... SELECT ... UNION ALL
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+def push_post(post):
+    """Разложить новый пост по лентам подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list("user_id", flat=True)
+    _insert(
+        TimelineEntry(
+            user_id=user_id, post_id=post.id, author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in followers.iterator(chunk_size=BATCH_SIZE)
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавить в ленту подписчика уже опубликованные посты автора."""
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list("id", "pub_date")
+    _insert(
+        TimelineEntry(
+            user_id=user_id, post_id=post_id, author_id=author_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts.iterator(chunk_size=BATCH_SIZE)
+    )
+
+
+def trim(user_id, author_id):
+    """Убрать посты автора из ленты отписавшегося читателя."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id
+    ).delete()
+
+
+def author_demoted(author_id):
+    """Автор опустился ниже порога: раздать его посты подписчикам.
+
+    Пока автор был «знаменитостью», его новые посты не раскладывались,
+    и без этой догрузки они пропали бы из лент.
+    """
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list("user_id", flat=True)
+    for user_id in followers.iterator(chunk_size=BATCH_SIZE):
+        backfill(user_id, author_id)
+
+
+@transaction.atomic
+def rebuild():
+    """Пересобрать все ленты по текущим подпискам.
+
+    Одним ``INSERT ... SELECT``: по запросу на подписку это часы на
+    миллионах подписок. Нужны актуальные ``UserStats.followers_count``.
+    """
+    TimelineEntry.objects.all().delete()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {TimelineEntry._meta.db_table}"
+            f" (user_id, post_id, author_id, pub_date)"
+            f" SELECT follow.user_id, post.id, post.author_id, post.pub_date"
+            f" FROM {Follow._meta.db_table} follow"
+            f" JOIN {Post._meta.db_table} post"
+            f" ON post.author_id = follow.author_id"
+            f" LEFT JOIN {UserStats._meta.db_table} stats"
+            f" ON stats.user_id = follow.author_id"
+            f" WHERE COALESCE(stats.followers_count, 0) < %s",
+            [fanout_limit()],
+        )
+
+
+def celebrities_followed(user):
+    return Follow.objects.filter(
+        user=user, author__stats__followers_count__gte=fanout_limit()
+    ).values_list("author_id", flat=True)
+
+
+def feed_for(user):
+    """Посты ленты подписок ``user``."""
+    celebrities = list(celebrities_followed(user))
+    if not celebrities:
+        return Post.objects.filter(timeline_entries__user=user)
+    entries = TimelineEntry.objects.filter(user=user).values("post_id")
+    return Post.objects.filter(
+        Q(id__in=entries) | Q(author_id__in=celebrities)
+    )
+
+
+def feed_page(user, cursor=None):
+    """Страница ленты подписок ``user`` по курсору.
+
+    Записи ленты и посты популярных авторов читаются по своим индексам
+    с одного курсора и сливаются; пост к записи присоединяется по
+    первичному ключу только для строк страницы.
+    """
+    celebrities = list(celebrities_followed(user))
+    entries = TimelineEntry.objects.filter(user=user).select_related(
+        "post__author", "post__group"
+    ).only("post", "pub_date", *(f"post__{field}" for field in FEED_FIELDS))
+    extra = []
+    if celebrities:
+        # пока автор не стал популярным, его посты раскладывались
+        entries = entries.exclude(author_id__in=celebrities)
+        extra.append((
+            Post.objects.for_feed().filter(author_id__in=celebrities),
+            FEED_ORDERING,
+        ))
+    paginator = KeysetPaginator(
+        entries, POSTS_PER_PAGE, TIMELINE_ORDERING, extra=extra
+    )
+    page = paginator.get_cursor_page(cursor)
+    page.object_list = [
+        row.post if isinstance(row, TimelineEntry) else row
+        for row in page.object_list
+    ]
+    return page
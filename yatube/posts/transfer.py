@@ -0,0 +1,252 @@
+"""Потоковые выгрузка и загрузка постов, групп, комментариев и подписок.
+
+Каждая таблица пишется в свой файл ``<table>.ndjson`` или
+``<table>.csv`` пачками из ``iterator(chunk_size=...)`` и читается
+построчно, так что память не зависит от размера таблицы. Загрузка идёт
+через ``bulk_create`` пачками, каждая в своей транзакции. После каждой
+пачки в ``<table>.checkpoint`` записывается, докуда дошли, и прерванный
+прогон продолжается с ``resume=True``. Картинки постов копируются или
+связываются жёсткими ссылками как есть, без перекодирования.
+
+Пользователи не переносятся: ``author_id`` и ``user_id`` должны
+существовать в целевой БД.
+"""
+import csv
+import io
+import json
+import os
+import shutil
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Comment, Follow, Group, Post
+
+TABLES = {
+    "groups": (Group, ("id", "title", "slug", "description")),
+    "posts": (
+        Post, (
+            "id", "text", "pub_date", "updated", "author_id", "group_id",
+            "image",
+        )
+    ),
+    "comments": (
+        Comment, ("id", "post_id", "author_id", "text", "created")
+    ),
+    "follows": (Follow, ("id", "user_id", "author_id")),
+}
+# таблицы, которые можно грузить только после перечисленных
+DEPENDENCIES = {"posts": ("groups",), "comments": ("posts",)}
+FORMATS = ("ndjson", "csv")
+MEDIA_MODES = ("copy", "link", "skip")
+MEDIA_DIR = "media"
+
+
+def data_path(directory, table, file_format):
+    return os.path.join(directory, f"{table}.{file_format}")
+
+
+def _checkpoint_path(directory, table):
+    return os.path.join(directory, f"{table}.checkpoint")
+
+
+def read_checkpoint(directory, table):
+    try:
+        with open(_checkpoint_path(directory, table), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_checkpoint(directory, table, state):
+    path = _checkpoint_path(directory, table)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+        json.dump(state, file)
+    os.replace(f"{path}.tmp", path)
+
+
+def stages(tables):
+    """Разбить таблицы на этапы: внутри этапа их можно грузить параллельно."""
+    remaining = [table for table in TABLES if table in tables]
+    result = []
+    while remaining:
+        ready = [
+            table for table in remaining
+            if not set(DEPENDENCIES.get(table, ())) & set(remaining)
+        ]
+        result.append(ready)
+        remaining = [table for table in remaining if table not in ready]
+    return result
+
+
+def clear_checkpoint(directory, table):
+    try:
+        os.remove(_checkpoint_path(directory, table))
+    except FileNotFoundError:
+        pass
+
+
+@contextmanager
+def preserved_timestamps(model):
+    """Не подменять ``auto_now``/``auto_now_add``-даты текущим временем."""
+    fields = [
+        (field, field.auto_now, field.auto_now_add)
+        for field in model._meta.fields
+        if getattr(field, "auto_now", False)
+        or getattr(field, "auto_now_add", False)
+    ]
+    for field, _, _ in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in fields:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def transfer_media(name, source_root, target_root, mode):
+    """Скопировать или связать файл картинки, если его ещё нет."""
+    if not name or mode == "skip":
+        return
+    source = os.path.join(source_root, name)
+    target = os.path.join(target_root, name)
+    if os.path.exists(target) or not os.path.exists(source):
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if mode == "link":
+        try:
+            os.link(source, target)
+            return
+        except OSError:
+            pass
+    shutil.copyfile(source, target)
+
+
+def _isoformat(value):
+    # DjangoJSONEncoder отбрасывает микросекунды
+    return value.isoformat()
+
+
+def _encode(rows, fields, file_format):
+    if file_format == "ndjson":
+        return "".join(
+            json.dumps(dict(zip(fields, row)), default=_isoformat,
+                       ensure_ascii=False) + "\n"
+            for row in rows
+        ).encode()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(
+        ["" if value is None else value for value in row] for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+def export_table(directory, table, file_format="ndjson", chunk_size=2000,
+                 media="skip", resume=False):
+    """Выгрузить таблицу; вернуть число выгруженных строк."""
+    model, fields = TABLES[table]
+    path = data_path(directory, table, file_format)
+    state = read_checkpoint(directory, table) if resume else None
+    state = state or {"last_id": 0, "offset": 0, "rows": 0}
+    rows = model.objects.filter(id__gt=state["last_id"]).order_by("id")
+    media_root = os.path.join(directory, MEDIA_DIR)
+    with open(path, "r+b" if state["offset"] else "wb") as file:
+        file.truncate(state["offset"])
+        file.seek(state["offset"])
+        if not state["offset"] and file_format == "csv":
+            file.write(_encode([fields], fields, file_format))
+        chunk = []
+        for row in rows.values_list(*fields).iterator(chunk_size=chunk_size):
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                _flush_export(file, chunk, fields, file_format, state)
+                write_checkpoint(directory, table, state)
+                chunk = []
+            if table == "posts":
+                transfer_media(
+                    row[fields.index("image")], settings.MEDIA_ROOT,
+                    media_root, media,
+                )
+        _flush_export(file, chunk, fields, file_format, state)
+    clear_checkpoint(directory, table)
+    return state["rows"]
+
+
+def _flush_export(file, chunk, fields, file_format, state):
+    if not chunk:
+        return
+    file.write(_encode(chunk, fields, file_format))
+    file.flush()
+    state.update(
+        last_id=chunk[-1][0], offset=file.tell(),
+        rows=state["rows"] + len(chunk),
+    )
+
+
+def _read_rows(path, file_format):
+    with open(path, encoding="utf-8", newline="") as file:
+        if file_format == "ndjson":
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        reader = csv.reader(file)
+        header = next(reader, None)
+        for values in reader:
+            yield dict(zip(header, values))
+
+
+def _build(model, fields, record):
+    values = {}
+    for name in fields:
+        field = model._meta.get_field(name)
+        value = record.get(name)
+        if value == "" and not field.empty_strings_allowed:
+            value = None
+        values[field.attname] = (
+            None if value is None else field.to_python(value)
+        )
+    return model(**values)
+
+
+def import_table(directory, table, file_format="ndjson", batch_size=1000,
+                 media="copy", resume=False):
+    """Загрузить таблицу; вернуть число обработанных строк.
+
+    Строки с уже существующим ``id`` пропускаются, поэтому повторный
+    прогон безопасен.
+    """
+    model, fields = TABLES[table]
+    state = read_checkpoint(directory, table) if resume else None
+    done = state["rows"] if state else 0
+    media_root = os.path.join(directory, MEDIA_DIR)
+    batch = []
+    seen = 0
+    with preserved_timestamps(model):
+        for record in _read_rows(
+            data_path(directory, table, file_format), file_format
+        ):
+            seen += 1
+            if seen <= done:
+                continue
+            batch.append(_build(model, fields, record))
+            if table == "posts":
+                transfer_media(
+                    record.get("image"), media_root, settings.MEDIA_ROOT,
+                    media,
+                )
+            if len(batch) == batch_size:
+                _insert(model, batch)
+                write_checkpoint(directory, table, {"rows": seen})
+                batch = []
+        _insert(model, batch)
+    clear_checkpoint(directory, table)
+    return seen
+
+
+def _insert(model, batch):
+    if batch:
+        with transaction.atomic():
+            model.objects.bulk_create(batch, ignore_conflicts=True)
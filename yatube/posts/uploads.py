@@ -0,0 +1,106 @@
+"""Приём картинок постов.
+
+Загрузка пишется во временный файл кусками (``LimitedUploadHandler``),
+и всё, что сверх ``POST_IMAGE_MAX_BYTES``, отбрасывается сразу. Размеры
+картинки проверяются по заголовку, до декодирования пикселей. Затем
+картинка уменьшается до ``POST_IMAGE_MAX_SIDE`` по большей стороне
+(JPEG декодируется сразу в уменьшенном масштабе), поворачивается по
+EXIF и пересохраняется в ``POST_IMAGE_FORMAT`` без метаданных.
+
+Пересохранение детерминировано, а хранилище поля называет файл по
+хешу содержимого (``core.storage.HashedStorage``), поэтому повторная
+загрузка того же файла не занимает места второй раз.
+"""
+import io
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, ImageOps, features
+
+EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp"}
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Временный файл не длиннее ``POST_IMAGE_MAX_BYTES``.
+
+    Остаток загрузки не пишется, но ``size`` файла остаётся настоящим,
+    и форма отклонит его, не читая.
+    """
+
+    def receive_data_chunk(self, raw_data, start):
+        limit = settings.POST_IMAGE_MAX_BYTES
+        if start < limit:
+            super().receive_data_chunk(raw_data[:limit - start], start)
+
+
+def image_format():
+    name = settings.POST_IMAGE_FORMAT
+    if name == "WEBP" and not features.check("webp"):
+        return "JPEG"
+    return name
+
+
+def _open(upload):
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError("Файл повреждён или не является картинкой.")
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            f"Картинка {width}×{height} слишком велика: должно быть не"
+            f" больше {settings.POST_IMAGE_MAX_PIXELS} пикселей."
+        )
+    return image
+
+
+def _rgb(image):
+    if image.mode == "RGB":
+        return image
+    if image.mode in ("RGBA", "LA") or "transparency" in image.info:
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def encode(upload, file_format):
+    """Уменьшить, повернуть по EXIF и пересохранить без метаданных."""
+    image = _open(upload)
+    side = settings.POST_IMAGE_MAX_SIDE
+    try:
+        # thumbnail сам просит у JPEG декодирования в меньшем масштабе
+        image.thumbnail((side, side), Image.LANCZOS)
+        image = _rgb(ImageOps.exif_transpose(image))
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise ValidationError("Файл повреждён или не является картинкой.")
+    buffer = io.BytesIO()
+    image.save(
+        buffer, file_format, quality=settings.POST_IMAGE_QUALITY,
+        optimize=True,
+    )
+    return buffer.getvalue()
+
+
+def clean_image(image):
+    """Обработать новую загрузку поля ``image`` формы поста.
+
+    Прежняя картинка (``FieldFile``) и отметка об удалении возвращаются
+    как есть. Имя файла выберет хранилище.
+    """
+    if not isinstance(image, UploadedFile):
+        return image
+    if image.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            f"Файл больше {settings.POST_IMAGE_MAX_BYTES // 2 ** 20} МБ."
+        )
+    file_format = image_format()
+    return ContentFile(
+        encode(image, file_format),
+        name=f"image.{EXTENSIONS[file_format]}",
+    )
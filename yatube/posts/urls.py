@@ -8,8 +8,11 @@ urlpatterns = [
     path("group/<slug:slug>/", views.group_posts, name="group_posts"),
     path("profile/<str:username>/", views.profile, name="profile"),
     path("posts/<int:post_id>/", views.post_detail, name="post_detail"),
+    path("search/", views.post_search, name="post_search"),
     path("create/", views.post_create, name="post_create"),
     path("posts/<int:post_id>/edit/", views.post_edit, name="post_edit"),
+    path("posts/<int:post_id>/comments/",
+         views.post_comments, name="post_comments"),
     path("posts/<int:post_id>/comment/",
          views.add_comment, name="add_comment"),
     path("follow/", views.follow_index, name="follow_index"),
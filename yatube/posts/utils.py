@@ -1,8 +1,185 @@
+import base64
+import json
+
+from django.conf import settings
 from django.core.paginator import Paginator
+from django.db.models import Q
+
+POSTS_PER_PAGE = 10
+FEED_ORDERING = ("-pub_date", "-id")
+COMMENTS_PER_PAGE = 20
+# совпадает с индексом (post, created): id в SQLite входит в индекс сам
+COMMENT_ORDERING = ("created", "id")
+
+
+def _fields(ordering):
+    return [key.lstrip("-") for key in ordering]
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор по ключу (seek): без COUNT(*) и без OFFSET.
+
+    Страницы адресуются непрозрачным курсором, в котором закодированы
+    значения полей ``ordering`` граничной записи и направление обхода.
+
+    ``extra`` — ещё выборки со своим ``ordering`` из полей тех же типов
+    и направлений: страница сливается из первых записей каждой.
+    """
+
+    is_keyset = True
+
+    def __init__(self, object_list, per_page, ordering=FEED_ORDERING,
+                 extra=()):
+        super().__init__(object_list.order_by(*ordering), per_page)
+        self.ordering = tuple(ordering)
+        self.extra = list(extra)
+
+    @property
+    def fields(self):
+        return _fields(self.ordering)
+
+    def encode_cursor(self, obj, direction):
+        return self._encode(
+            [getattr(obj, field) for field in self.fields], direction
+        )
 
+    @staticmethod
+    def _encode(values, direction):
+        payload = [direction] + [
+            value.isoformat() if hasattr(value, "isoformat") else value
+            for value in values
+        ]
+        raw = json.dumps(payload, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
 
-def paginate_page(request, post_list):
-    POSTS_PER_PAGE = 10
-    paginator = Paginator(post_list, POSTS_PER_PAGE)
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            direction, *values = json.loads(
+                base64.urlsafe_b64decode(padded.encode())
+            )
+        except (TypeError, ValueError):
+            return None
+        if direction not in ("next", "prev") or len(values) != len(
+            self.fields
+        ):
+            return None
+        model = self.object_list.model
+        try:
+            values = [
+                model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except Exception:
+            return None
+        # NULL в ключе не бывает, а Q(pub_date__lt=None) — ошибка
+        if None in values:
+            return None
+        return direction, values
+
+    @staticmethod
+    def _seek(ordering, values, reverse):
+        """Условие «строго после ``values``» в порядке ``ordering``."""
+        fields = _fields(ordering)
+        condition = Q()
+        for index, key in enumerate(ordering):
+            descending = key.startswith("-") != reverse
+            lookup = "lt" if descending else "gt"
+            step = Q(**{f"{fields[index]}__{lookup}": values[index]})
+            for field, value in zip(fields[:index], values[:index]):
+                step &= Q(**{field: value})
+            condition |= step
+        return condition
+
+    def _fetch(self, decoded):
+        """До ``per_page + 1`` записей после курсора в порядке обхода.
+
+        Записи идут парами (значения ключа, объект).
+        """
+        reverse = decoded is not None and decoded[0] == "prev"
+        rows = []
+        for queryset, ordering in [(self.object_list, self.ordering),
+                                   *self.extra]:
+            if decoded is not None:
+                queryset = queryset.filter(
+                    self._seek(ordering, decoded[1], reverse)
+                )
+            if reverse:
+                ordering = [
+                    key[1:] if key.startswith("-") else f"-{key}"
+                    for key in ordering
+                ]
+            fields = _fields(ordering)
+            rows += [
+                (tuple(getattr(obj, field) for field in fields), obj)
+                for obj in queryset.order_by(*ordering)[:self.per_page + 1]
+            ]
+        if self.extra:
+            # устойчивые сортировки от младшего ключа к старшему
+            for index, key in reversed(list(enumerate(self.ordering))):
+                descending = key.startswith("-") != reverse
+                rows.sort(key=lambda row: row[0][index], reverse=descending)
+        return rows[:self.per_page + 1]
+
+    def get_cursor_page(self, cursor=None):
+        """Страница после (или до) курсора.
+
+        Возвращается обычный ``Page``: номер страницы и ``num_pages``
+        подбираются так, чтобы ``has_next``/``has_previous`` отвечали
+        по факту выборки, а курсоры соседних страниц лежат в атрибутах
+        ``next_cursor`` и ``previous_cursor``.
+        """
+        decoded = self.decode_cursor(cursor) if cursor else None
+        direction = decoded[0] if decoded else None
+        rows = self._fetch(decoded)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == "prev":
+            rows.reverse()
+            # пустая страница «назад»: курсора для ссылки вперёд нет
+            has_previous, has_next = has_more, bool(rows)
+        else:
+            has_previous, has_next = direction == "next", has_more
+        number = 2 if has_previous else 1
+        self.num_pages = number + 1 if has_next else number
+        page = self._get_page([obj for _, obj in rows], number, self)
+        page.next_cursor = page.previous_cursor = None
+        if rows and has_next:
+            page.next_cursor = self._encode(rows[-1][0], "next")
+        if rows and has_previous:
+            page.previous_cursor = self._encode(rows[0][0], "prev")
+        return page
+
+
+def uses_cursor(request):
+    """Листать ли ленту курсором, а не по номеру страницы."""
+    return (
+        getattr(settings, "POSTS_KEYSET_PAGINATION", True)
+        and not request.GET.get("page")
+    )
+
+
+def paginate_page(request, post_list, ordering=FEED_ORDERING, count=None):
+    """Страница ленты.
+
+    По умолчанию (``POSTS_KEYSET_PAGINATION``) лента листается курсорами
+    ``?cursor=``; старые ссылки вида ``?page=N`` обслуживает обычный
+    ``Paginator``. Известное заранее число записей (``count``, например
+    из счётчиков) избавляет его от запроса ``COUNT(*)``.
+    """
     page_number = request.GET.get("page")
+    if uses_cursor(request):
+        paginator = KeysetPaginator(post_list, POSTS_PER_PAGE, ordering)
+        return paginator.get_cursor_page(request.GET.get("cursor"))
+    paginator = Paginator(post_list.order_by(*ordering), POSTS_PER_PAGE)
+    if count is not None:
+        paginator.count = count
     return paginator.get_page(page_number)
+
+
+def paginate_comments(request, comments):
+    """Комментарии поста от старых к новым, страницами по курсору."""
+    paginator = KeysetPaginator(
+        comments, COMMENTS_PER_PAGE, COMMENT_ORDERING
+    )
+    return paginator.get_cursor_page(request.GET.get("cursor"))
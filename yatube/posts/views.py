@@ -1,28 +1,49 @@
+from urllib.parse import urlencode
+
 from django.shortcuts import render, get_object_or_404, redirect
 from .models import Post, Group, Follow
 from .forms import PostForm, CommentForm
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
-from .utils import paginate_page
-from django.views.decorators.cache import cache_page
+from django.core.paginator import Paginator
+from django.views.decorators.vary import vary_on_cookie
+from core.profiling import query_budget
+from . import conditional, counters, feed_cache, search, thumbnails
+from .utils import (
+    POSTS_PER_PAGE, paginate_comments, paginate_page, uses_cursor
+)
+from .timeline import feed_for, feed_page
 
 User = get_user_model()
 
 
-@cache_page(20)
+@query_budget(queries=4)
+@vary_on_cookie
+@conditional.conditional_page(conditional.index)
 def index(request):
-    post_list = Post.objects.all()
-    page_obj = paginate_page(request, post_list)
+    page_obj = feed_cache.cached_page(
+        request,
+        ["all"],
+        lambda: paginate_page(request, Post.objects.for_feed())
+    )
     context = {
         "page_obj": page_obj
     }
     return render(request, "posts/index.html", context)
 
 
+@query_budget(queries=6)
+@vary_on_cookie
+@conditional.conditional_page(conditional.group_posts)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    page_obj = paginate_page(request, post_list)
+    page_obj = feed_cache.cached_page(
+        request,
+        [f"group:{group.id}"],
+        lambda: paginate_page(
+            request, group.posts.for_feed(), count=group.posts_count
+        )
+    )
     title = group.title
     description = group.description
     context = {
@@ -34,11 +55,23 @@ def group_posts(request, slug):
     return render(request, "posts/group_list.html", context)
 
 
+@query_budget(queries=7)
+@vary_on_cookie
+@conditional.conditional_page(conditional.profile)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.select_related("author")
+    author = get_object_or_404(
+        User.objects.select_related("stats"), username=username
+    )
     template = "posts/profile.html"
-    page_obj = paginate_page(request, post_list)
+    page_obj = feed_cache.cached_page(
+        request,
+        [f"author:{author.id}"],
+        lambda: paginate_page(
+            request,
+            author.posts.for_feed(),
+            count=counters.posts_count(author)
+        )
+    )
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user,
         author__username=username).exists()
@@ -50,10 +83,14 @@ def profile(request, username):
     return render(request, template, context)
 
 
+@query_budget(queries=6)
+@vary_on_cookie
+@conditional.conditional_page(conditional.post_detail)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(Post.objects.for_detail(), id=post_id)
+    thumbnails.prefetch([post])
     form = CommentForm()
-    comments = post.comments.select_related("post")
+    comments = paginate_comments(request, post.comments.with_authors())
     context = {
         "post": post,
         "form": form,
@@ -62,6 +99,37 @@ def post_detail(request, post_id):
     return render(request, "posts/post_detail.html", context)
 
 
+@query_budget(queries=4)
+@vary_on_cookie
+@conditional.conditional_page(conditional.post_detail)
+def post_comments(request, post_id):
+    """Следующая пачка комментариев для подгрузки на странице поста."""
+    post = get_object_or_404(Post.objects.only("id"), id=post_id)
+    comments = paginate_comments(request, post.comments.with_authors())
+    context = {
+        "post": post,
+        "comments": comments
+    }
+    return render(request, "posts/includes/comments.html", context)
+
+
+@query_budget(queries=6)
+def post_search(request):
+    query = request.GET.get("q", "").strip()
+    results = search.SearchResults(query, Post.objects.for_feed())
+    page_obj = Paginator(results, POSTS_PER_PAGE).get_page(
+        request.GET.get("page")
+    )
+    thumbnails.prefetch(page_obj)
+    context = {
+        "page_obj": page_obj,
+        "query": query,
+        "page_query": urlencode({"q": query}) + "&",
+    }
+    return render(request, "posts/search.html", context)
+
+
+@query_budget(queries=12)
 @login_required
 def post_create(request):
     if request.method == "POST":
@@ -86,6 +154,7 @@ def post_create(request):
     return render(request, "posts/create_post.html", context)
 
 
+@query_budget(queries=12)
 @login_required
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
@@ -99,7 +168,7 @@ def post_edit(request, post_id):
         "is_edit": True,
         "id": post_id,
     }
-    if post.author != request.user:
+    if post.author_id != request.user.id:
         return redirect("posts:post_detail", post_id=post_id)
     if request.method == "POST":
         if form.is_valid():
@@ -109,9 +178,10 @@ def post_edit(request, post_id):
     return render(request, "posts/create_post.html", context)
 
 
+@query_budget(queries=10)
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(Post.objects.only("id"), id=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -121,16 +191,20 @@ def add_comment(request, post_id):
     return redirect("posts:post_detail", post_id=post_id)
 
 
+@query_budget(queries=8)
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginate_page(request, post_list)
+    if uses_cursor(request):
+        page_obj = feed_page(request.user, request.GET.get("cursor"))
+    else:
+        page_obj = paginate_page(request, feed_for(request.user).for_feed())
     context = {
         "page_obj": page_obj
     }
     return render(request, "posts/follow.html", context)
 
 
+@query_budget(queries=15)
 @login_required
 def profile_follow(request, username):
     follow = get_object_or_404(User, username=username)
@@ -139,6 +213,7 @@ def profile_follow(request, username):
     return redirect("posts:profile", username=username)
 
 
+@query_budget(queries=15)
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
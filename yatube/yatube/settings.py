@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -50,6 +51,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.MetricsMiddleware",
+    "core.middleware.ProfilingMiddleware",
+    "core.middleware.ReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -64,7 +68,7 @@ ROOT_URLCONF = "yatube.urls"
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "core.profiling.TimedDjangoTemplates",
         "DIRS": [TEMPLATES_DIR],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -88,7 +92,11 @@ WSGI_APPLICATION = "yatube.wsgi.application"
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
+        "NAME": os.getenv(
+            "YATUBE_DB_PATH", os.path.join(BASE_DIR, "db.sqlite3")
+        ),
+        # соединение живёт всё время воркера; PRAGMA из core.sqlite
+        "CONN_MAX_AGE": None,
     }
 }
 
@@ -131,6 +139,12 @@ USE_TZ = True
 
 STATIC_URL = "/static/"
 STATICFILES_DIRS = [os.path.join(BASE_DIR, "static")]
+STATIC_ROOT = os.getenv(
+    "YATUBE_STATIC_ROOT", os.path.join(BASE_DIR, "static_collected")
+)
+if not DEBUG:
+    # имена с хешем и сжатые копии готовит collectstatic
+    STATICFILES_STORAGE = "core.storage.CompressedManifestStaticFilesStorage"
 LOGIN_URL = "users:login"
 LOGIN_REDIRECT_URL = "posts:home_page"
 EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
@@ -138,8 +152,96 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 CSRF_FAILURE_VIEW = "core.views.csrf_failure"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+# небольшие загрузки держим в памяти, остальные пишем во временный файл
+FILE_UPLOAD_HANDLERS = [
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "posts.uploads.LimitedUploadHandler",
+]
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+POST_IMAGE_MAX_BYTES = 10 * 2 ** 20
+POST_IMAGE_MAX_PIXELS = 40 * 10 ** 6
+POST_IMAGE_MAX_SIDE = 2048
+# WEBP, если Pillow собран с libwebp; иначе JPEG
+POST_IMAGE_FORMAT = "JPEG"
+POST_IMAGE_QUALITY = 85
+# столько секунд после последней загрузки файл не удаляется
+POST_IMAGE_RELEASE_GRACE = 60 * 60
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "BACKEND": "core.cache.SQLiteCache",
+        "LOCATION": os.getenv(
+            "YATUBE_CACHE_PATH", os.path.join(BASE_DIR, "cache.sqlite3")
+        ),
+        "OPTIONS": {
+            "MAX_ENTRIES": 100000,
+            "MAX_SIZE": 256 * 2 ** 20,
+        },
     }
 }
+# тесты держат кеш и другие файлы во временном каталоге, см. core.testing
+TEST_RUNNER = "core.testing.DiscoverRunner"
+POSTS_KEYSET_PAGINATION = True
+TIMELINE_FANOUT_LIMIT = 10000
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+FEED_CACHE_FRESH = 60 * 10
+POST_CARD_TIMEOUT = 60 * 60 * 24
+THUMBNAIL_BACKEND = "posts.thumbnails.DeferredThumbnailBackend"
+THUMBNAIL_KVSTORE = "posts.thumbnail_store.SQLiteKVStore"
+THUMBNAIL_KVSTORE_PATH = os.getenv(
+    "YATUBE_THUMBNAIL_INDEX", os.path.join(BASE_DIR, "thumbnails.sqlite3")
+)
+# превью карточки: самое широкое и лесенка ширин для srcset
+THUMBNAIL_CARD_SIZE = (960, 339)
+THUMBNAIL_WIDTHS = [320, 480, 640, 960]
+THUMBNAIL_FORMATS = ["WEBP", "JPEG"]
+THUMBNAIL_SIZES = "(min-width: 992px) 960px, 100vw"
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_ALWAYS_EAGER = False
+# без DEBUG задания ждут manage.py run_workers, с ним выполняются сразу
+JOBS_ALWAYS_EAGER = DEBUG
+JOBS_POLL_INTERVAL = 1.0
+JOBS_VISIBILITY_TIMEOUT = 5 * 60
+# превышение бюджета запросов — исключение, а не запись в лог;
+# тесты включают это в core.testing
+QUERY_BUDGET_RAISE = False
+PROFILE_DUPLICATE_THRESHOLD = 3
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "message": {"format": "%(message)s"},
+    },
+    "handlers": {
+        "profile": {
+            "class": "logging.StreamHandler",
+            "formatter": "message",
+        },
+    },
+    "loggers": {
+        "core.profiling": {
+            "handlers": ["profile"],
+            "level": os.getenv("YATUBE_PROFILE_LOG", "INFO"),
+            "propagate": False,
+        },
+    },
+}
+METRICS_DIR = os.getenv(
+    "YATUBE_METRICS_DIR", os.path.join(tempfile.gettempdir(), "yatube-metrics")
+)
+DATABASE_ROUTERS = ["core.db_router.ReplicaRouter"]
+# пути к копиям основной БД через запятую (см. manage.py sync_replicas)
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+    filter(None, os.getenv("YATUBE_DB_REPLICAS", "").split(",")), 1
+):
+    DATABASES[f"replica_{number}"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": path,
+        "CONN_MAX_AGE": None,
+    }
+    DATABASE_REPLICAS.append(f"replica_{number}")
+REPLICA_PIN_COOKIE = "pin_primary"
+REPLICA_PIN_SECONDS = 15
+REPLICA_CHECK_INTERVAL = 2
+# допустимое отставание реплики, в секундах
+REPLICA_MAX_LAG = 0
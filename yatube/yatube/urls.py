@@ -1,30 +1,23 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+
+from core.views import media_file, metrics, static_file
 
 urlpatterns = [
     path("auth/", include("users.urls", namespace="users")),
     path("auth/", include("django.contrib.auth.urls")),
     path("admin/", admin.site.urls),
+    path("metrics", metrics, name="metrics"),
     path("", include("posts.urls", namespace="posts")),
     path("about/", include("about.urls", namespace="about")),
 ]
 
 handler404 = "core.views.page_not_found"
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )
-
 handler500 = "core.views.page_500"
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )
-
 handler403 = "core.views.page_403"
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )
+
+urlpatterns += [
+    path(f"{settings.STATIC_URL.lstrip('/')}<path:path>", static_file),
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:path>", media_file),
+]